@@ -4,38 +4,65 @@ import csv
 from django import forms
 from django.contrib import admin, messages
 from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
-from django.http import HttpResponse
-from django.shortcuts import render
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.urls import path, reverse
 from django.utils import timezone
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
 
 from simple_history.admin import SimpleHistoryAdmin
-from import_export import resources
 from import_export.admin import ImportExportModelAdmin
 
-from .models import License, Product, Customer, ClientType
-from .forms import BulkUpdateDatesForm, SetProductForm, BulkStatusForm
-
-
-class LicenseResource(resources.ModelResource):
-    class Meta:
-        model = License
-        fields = (
-            'id',
-            'license_number',
-            'customer',
-            'product',
-            'start_date',
-            'expiry_date',
-            'status',
-            'comment',
-            'created_at',
-            'updated_at',
+from .bulk import change_licenses_status
+from .models import License, Product, Customer, ClientType, LicenseToken, ExpirationAlert, ExportJob, BulkJob, LicenseEvent
+from .history import hydrate
+from .exports import EXPORT_HEADER, create_export_job, export_rows
+from .jobs import run_or_queue
+from .resources import LicensePreviewResource
+from .search import search_licenses
+from .selection import describe_selection
+from .forms import BulkUpdateDatesForm, SetProductForm, BulkStatusForm, ExportJobForm
+
+
+# Licenses listed on the confirmation page of a bulk action
+ACTION_PREVIEW_SIZE = 20
+
+
+def _apply_bulk_action(request, queryset, action, params):
+    """Run the bulk action now, or queue it for run_worker when the selection is large."""
+    message, job = run_or_queue(queryset, action, params, user=request.user, request=request)
+    if job is None:
+        messages.success(request, message)
+    else:
+        url = reverse('admin:license_app_bulkjob_change', args=[job.pk])
+        messages.info(
+            request,
+            format_html(
+                "⏳ Sélection volumineuse : <a href=\"{}\">{}</a> programmé, le résultat s'affichera ici une fois terminé.",
+                url, job,
+            ),
         )
-        export_order = fields
-        import_id_fields = ['license_number']
-        skip_unchanged = True
-        report_skipped = True
+
+
+def _action_context(modeladmin, request, queryset, form, title):
+    """
+    Context of the confirmation pages. Only a preview of the selection is
+    listed, and "select all" is forwarded instead of every primary key.
+    """
+    count = queryset.count()
+    preview = list(queryset.select_related('customer', 'product')[:ACTION_PREVIEW_SIZE])
+    return {
+        'form': form,
+        'count': count,
+        'preview': preview,
+        'remaining': count - len(preview),
+        'selected': request.POST.getlist(ACTION_CHECKBOX_NAME),
+        'select_across': request.POST.get('select_across', '0'),
+        'action_checkbox_name': ACTION_CHECKBOX_NAME,
+        'opts': modeladmin.model._meta,
+        'title': title,
+    }
 
 
 def set_product(modeladmin, request, queryset):
@@ -43,32 +70,15 @@ def set_product(modeladmin, request, queryset):
         form = SetProductForm(request.POST)
         if form.is_valid():
             product = form.cleaned_data['new_product']
-
-            objs = []
-            now = timezone.now()
-            for license in queryset:
-                license.change_product(product, save=False)
-                license.updated_at = now
-                objs.append(license)
-
-            if objs:
-                License.objects.bulk_update(objs, ['product', 'updated_at'])
-
-            messages.success(
-                request,
-                f"✅ {len(objs)} licence(s) mise(s) à jour avec le produit « {product} »."
-            )
+            _apply_bulk_action(request, queryset, 'set_product', {'product': product.pk})
             return None
     else:
         form = SetProductForm()
 
-    return render(request, 'admin/license_app/set_product_form.html', {
-        'form': form,
-        'queryset': queryset,
-        'action_checkbox_name': ACTION_CHECKBOX_NAME,
-        'opts': modeladmin.model._meta,
-        'title': "Modifier le produit en masse",
-    })
+    return render(
+        request, 'admin/license_app/set_product_form.html',
+        _action_context(modeladmin, request, queryset, form, "Modifier le produit en masse"),
+    )
 
 set_product.short_description = "📝 Modifier le produit"
 
@@ -76,60 +86,25 @@ def bulk_update_dates(modeladmin, request, queryset):
     if 'apply' in request.POST:
         form = BulkUpdateDatesForm(request.POST)
         if form.is_valid():
-            action = form.cleaned_data['action']
-            updated = 0
+            action = form.cleaned_data['date_action']
+            params = {'date_action': action}
 
             if action == 'extend':
-                days = form.cleaned_data['extension_days']
-                objs = []
-                now = timezone.now()
-                for license in queryset:
-                    if license.expiry_date:
-                        license.extend_validity(days, save=False)
-                        license.updated_at = now
-                        objs.append(license)
-
-                if objs:
-                    License.objects.bulk_update(objs, ['expiry_date', 'status', 'updated_at'])
-                    updated = len(objs)
-
-                messages.success(request, f"✅ {updated} licence(s) prolongée(s) de {days} jours.")
-
+                params['extension_days'] = form.cleaned_data['extension_days']
             elif action == 'set_start':
-                # No business logic side effect on start_date, so queryset.update is fine and efficient
-                start_date = form.cleaned_data['start_date']
-                updated = queryset.update(start_date=start_date, updated_at=timezone.now())
-                messages.success(request, f"✅ {updated} licence(s) mise(s) à jour.")
-
+                params['start_date'] = form.cleaned_data['start_date'].isoformat()
             elif action == 'set_expiry':
-                # Setting expiry date affects status, so we must load and check logic
-                expiry_date = form.cleaned_data['expiry_date']
-
-                objs = []
-                now = timezone.now()
-                for license in queryset:
-                    license.expiry_date = expiry_date
-                    license._update_status_from_expiry()
-                    license.updated_at = now
-                    objs.append(license)
-
-                if objs:
-                    License.objects.bulk_update(objs, ['expiry_date', 'status', 'updated_at'])
-                    updated = len(objs)
-
-                messages.success(request, f"✅ {updated} licence(s) mise(s) à jour.")
+                params['expiry_date'] = form.cleaned_data['expiry_date'].isoformat()
 
+            _apply_bulk_action(request, queryset, 'bulk_update_dates', params)
             return None
     else:
         form = BulkUpdateDatesForm()
 
-    return render(request, 'admin/license_app/bulk_update_dates_form.html', {
-        'form': form,
-        'queryset': queryset,
-        'action_checkbox_name': ACTION_CHECKBOX_NAME,
-        'opts': modeladmin.model._meta,
-        'title': "Gestion des dates en masse",
-    })
+    return render(
+        request, 'admin/license_app/bulk_update_dates_form.html',
+        _action_context(modeladmin, request, queryset, form, "Gestion des dates en masse"),
+    )
 
 bulk_update_dates.short_description = "📅 Gérer les dates"
 
@@ -138,98 +113,93 @@ def bulk_change_status(modeladmin, request, queryset):
     if 'apply' in request.POST:
         form = BulkStatusForm(request.POST)
         if form.is_valid():
-            status = form.cleaned_data['new_status']
-            comment = form.cleaned_data.get('comment')
-
-            objs = []
-            now = timezone.now()
-            for license in queryset:
-                license.change_status(status, comment, save=False)
-                license.updated_at = now
-                objs.append(license)
-
-            if objs:
-                License.objects.bulk_update(objs, ['status', 'comment', 'updated_at'])
-
-            messages.success(request, f"✅ {len(objs)} licence(s) mise(s) à jour.")
+            params = {
+                'status': form.cleaned_data['new_status'],
+                'comment': form.cleaned_data.get('comment'),
+            }
+            _apply_bulk_action(request, queryset, 'bulk_change_status', params)
             return None
     else:
         form = BulkStatusForm()
 
-    return render(request, 'admin/license_app/bulk_status_form.html', {
-        'form': form,
-        'queryset': queryset,
-        'action_checkbox_name': ACTION_CHECKBOX_NAME,
-        'opts': modeladmin.model._meta,
-        'title': "Changer le statut",
-    })
+    return render(
+        request, 'admin/license_app/bulk_status_form.html',
+        _action_context(modeladmin, request, queryset, form, "Changer le statut"),
+    )
 
 bulk_change_status.short_description = "🔄 Changer le statut"
 
 
 def activate_licenses(modeladmin, request, queryset):
-    objs = []
-    now = timezone.now()
-    for license in queryset:
-        license.activate(save=False)
-        license.updated_at = now
-        objs.append(license)
-
-    if objs:
-        License.objects.bulk_update(objs, ['status', 'updated_at'])
-
-    messages.success(request, "✅ Licences activées.")
+    updated = change_licenses_status(queryset, 'active', user=request.user, reason="Activation en masse")
+    messages.success(request, f"✅ {updated} licence(s) activée(s).")
 
 activate_licenses.short_description = "✅ Activer"
 
 
 def suspend_licenses(modeladmin, request, queryset):
-    objs = []
-    now = timezone.now()
-    for license in queryset:
-        license.suspend(save=False)
-        license.updated_at = now
-        objs.append(license)
+    updated = change_licenses_status(queryset, 'suspended', user=request.user, reason="Suspension en masse")
+    messages.warning(request, f"⚠️ {updated} licence(s) suspendue(s).")
 
-    if objs:
-        License.objects.bulk_update(objs, ['status', 'updated_at'])
+suspend_licenses.short_description = "⏸️ Suspendre"
 
-    messages.warning(request, "⚠️ Licences suspendues.")
+class Echo:
+    """Pseudo-buffer whose write() returns the value, so csv.writer can feed a streaming response."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_rows(queryset, chunk_size=2000):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_HEADER)
+    for row in export_rows(queryset, chunk_size=chunk_size):
+        yield writer.writerow(row)
 
-suspend_licenses.short_description = "⏸️ Suspendre"
 
 def export_selected_to_csv(modeladmin, request, queryset):
-    response = HttpResponse(content_type='text/csv')
+    response = StreamingHttpResponse(_csv_rows(queryset), content_type='text/csv')
     response['Content-Disposition'] = (
         f'attachment; filename="licences_{timezone.now():%Y%m%d_%H%M%S}.csv"'
     )
+    return response
 
-    writer = csv.writer(response)
-    writer.writerow([
-        'Numéro', 'Client', 'Produit', 'Début', 'Expiration', 'Statut', 'Jours restants'
-    ])
+export_selected_to_csv.short_description = "📥 Exporter en CSV"
 
-    queryset = queryset.select_related('product')
 
-    for license in queryset:
-        writer.writerow([
-            license.license_number,
-            license.customer,
-            license.product,
-            license.start_date,
-            license.expiry_date,
-            license.get_status_display(),
-            license.days_until_expiry() or 'N/A',
-        ])
+def export_in_background(modeladmin, request, queryset):
+    if 'apply' in request.POST:
+        form = ExportJobForm(request.POST)
+        if form.is_valid():
+            job = create_export_job(
+                describe_selection(queryset, request), form.cleaned_data['format'], user=request.user,
+            )
+            url = reverse('admin:license_app_exportjob_change', args=[job.pk])
+            messages.success(
+                request,
+                format_html("✅ Export programmé : <a href=\"{}\">{}</a>.", url, job),
+            )
+            return None
+    else:
+        form = ExportJobForm()
 
-    return response
+    return render(request, 'admin/license_app/export_job_form.html', {
+        'form': form,
+        'count': queryset.count(),
+        'selected': request.POST.getlist(ACTION_CHECKBOX_NAME),
+        'select_across': request.POST.get('select_across', '0'),
+        'action_checkbox_name': ACTION_CHECKBOX_NAME,
+        'opts': modeladmin.model._meta,
+        'title': "Exporter en arrière-plan",
+    })
 
-export_selected_to_csv.short_description = "📥 Exporter en CSV"
+export_in_background.short_description = "🗂️ Exporter en arrière-plan"
 
 
 @admin.register(License)
 class LicenseAdmin(ImportExportModelAdmin, SimpleHistoryAdmin):
-    resource_class = LicenseResource
+    # Keeps the per-row diff for the import preview, import_licenses does without
+    resource_class = LicensePreviewResource
 
     list_display = (
         'license_number_display',
@@ -248,16 +218,18 @@ class LicenseAdmin(ImportExportModelAdmin, SimpleHistoryAdmin):
         ('expiry_date', admin.DateFieldListFilter),
     )
 
+    # Prefix matches, plus comment words; the search itself is get_search_results()
     search_fields = (
-        'license_number',
-        'customer',
-        'product__name',
+        '^license_number',
+        '^customer__name',
+        '^product__name',
         'comment',
     )
 
     ordering = ('-expiry_date',)
     date_hierarchy = 'expiry_date'
-    readonly_fields = ('created_at', 'updated_at', 'expiry_status')
+    list_select_related = ('customer', 'product')
+    readonly_fields = ('created_at', 'updated_at', 'expiry_status', 'recent_events')
 
     actions = [
         set_product,
@@ -266,27 +238,90 @@ class LicenseAdmin(ImportExportModelAdmin, SimpleHistoryAdmin):
         activate_licenses,
         suspend_licenses,
         export_selected_to_csv,
+        export_in_background,
     ]
 
     fieldsets = (
         ('📋 Informations', {'fields': ('license_number', 'customer', 'product')}),
         ('📅 Dates', {'fields': ('start_date', 'expiry_date', 'expiry_status')}),
-        ('🔄 Statut', {'fields': ('status', 'comment')}),
+        ('🔄 Statut', {'fields': ('status', 'comment', 'recent_events')}),
         ('ℹ️ Métadonnées', {'fields': ('created_at', 'updated_at'), 'classes': ('collapse',)}),
     )
 
+    def get_queryset(self, request):
+        # Days to expiry and expiry tier are computed once in SQL for the whole page
+        return super().get_queryset(request).with_expiry()
+
+    def get_search_results(self, request, queryset, search_term):
+        # Every branch of the search is served by an index, see license_app.search
+        return search_licenses(queryset, search_term), False
+
+    # Events shown on the change form, the full log is paginated in LicenseEventAdmin
+    recent_events_count = 10
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'status' in form.changed_data:
+            LicenseEvent.objects.create(license=obj, status=obj.status, author=request.user)
+
+    def recent_events(self, obj):
+        if obj.pk is None:
+            return "-"
+        events = list(obj.events.select_related('author')[:self.recent_events_count])
+        if not events:
+            return "Aucun événement."
+        url = reverse('admin:license_app_licenseevent_changelist') + f'?license__id__exact={obj.pk}'
+        return format_html(
+            '<ul>{}</ul><a href="{}">Voir tous les événements</a>',
+            format_html_join(
+                '', '<li>{} - {} {} {}</li>',
+                (
+                    (
+                        f"{event.created_at:%d/%m/%Y %H:%M}",
+                        event.get_status_display() or "-",
+                        f"({event.author})" if event.author else "",
+                        event.message,
+                    )
+                    for event in events
+                ),
+            ),
+            url,
+        )
+    recent_events.short_description = "Derniers événements"
+
+    def set_history_delta_changes(self, request, historical_records, **kwargs):
+        # Delta records are rebuilt before simple_history diffs them
+        hydrate(list(historical_records))
+        super().set_history_delta_changes(request, historical_records, **kwargs)
+
+    def changelist_view(self, request, extra_context=None):
+        self.notify_finished_jobs(request)
+        return super().changelist_view(request, extra_context)
+
+    def notify_finished_jobs(self, request):
+        """Show the result of the user's bulk jobs that finished since the last visit."""
+        jobs = list(BulkJob.objects.filter(
+            created_by=request.user, status__in=['done', 'failed'], notified=False,
+        ).order_by('finished_at'))
+        for job in jobs:
+            if job.status == 'done':
+                messages.success(request, f"{job} : {job.result}")
+            else:
+                messages.error(request, f"❌ {job} a échoué : {job.error}")
+        if jobs:
+            BulkJob.objects.filter(pk__in=[job.pk for job in jobs]).update(notified=True)
 
     def license_number_display(self, obj):
         return format_html('<strong style="color:#417690;">{}</strong>', obj.license_number)
     license_number_display.short_description = "Licence"
 
     def expiry_date_display(self, obj):
-        days = obj.days_until_expiry()
-        if days is None:
+        tier = obj.get_expiry_tier()
+        if tier == 'none':
             return format_html('<span style="color:#999;">Non définie</span>')
-        if days < 0:
+        if tier == 'expired':
             color = '#dc3545'
-        elif days <= 30:
+        elif tier == 'soon':
             color = '#fd7e14'
         else:
             return obj.expiry_date
@@ -327,3 +362,110 @@ class CustomerAdmin(SimpleHistoryAdmin):
 class ClientTypeAdmin(admin.ModelAdmin):
     list_display = ('name',)
     search_fields = ('name',)
+
+
+@admin.register(LicenseToken)
+class LicenseTokenAdmin(admin.ModelAdmin):
+    list_display = ('license', 'issued_at')
+    search_fields = ('license__license_number',)
+    raw_id_fields = ('license',)
+    readonly_fields = ('token', 'issued_at')
+
+
+@admin.register(ExpirationAlert)
+class ExpirationAlertAdmin(admin.ModelAdmin):
+    list_display = ('license', 'threshold', 'expiry_date', 'sent_at')
+    list_filter = ('threshold',)
+    search_fields = ('license__license_number',)
+    raw_id_fields = ('license',)
+
+
+@admin.register(LicenseEvent)
+class LicenseEventAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'license', 'status', 'author', 'message')
+    list_filter = ('status',)
+    list_select_related = ('license__customer', 'author')
+    list_per_page = 50
+    search_fields = ('license__license_number',)
+    raw_id_fields = ('license', 'author')
+    date_hierarchy = 'created_at'
+
+    def has_change_permission(self, request, obj=None):
+        # Append-only log
+        return False
+
+    # Deletion is blocked in this admin's own views only: has_delete_permission()
+    # is also checked by the delete collector when a License or Customer is deleted
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        return super().change_view(request, object_id, form_url, {**(extra_context or {}), 'show_delete': False})
+
+    def delete_view(self, request, object_id, extra_context=None):
+        raise PermissionDenied
+
+
+@admin.register(BulkJob)
+class BulkJobAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'status', 'progress_display', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'action')
+    readonly_fields = (
+        'action', 'status', 'params', 'selection', 'progress_display', 'total', 'processed', 'result',
+        'error', 'created_by', 'created_at', 'started_at', 'heartbeat_at', 'finished_at',
+    )
+    exclude = ('notified',)
+
+    def has_add_permission(self, request):
+        # Jobs are queued by the license bulk actions on large selections
+        return False
+
+    def progress_display(self, obj):
+        return f"{obj.progress()} % ({obj.processed}/{obj.total})"
+    progress_display.short_description = "Progression"
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'status', 'progress_display', 'created_by', 'created_at', 'download_link')
+    list_filter = ('status', 'format')
+    readonly_fields = (
+        'format', 'status', 'selection', 'progress_display', 'total', 'processed', 'download_link',
+        'error', 'created_by', 'created_at', 'started_at', 'heartbeat_at', 'finished_at',
+    )
+    exclude = ('file_path',)
+
+    def has_add_permission(self, request):
+        # Jobs are created from the "Exporter en arrière-plan" license action
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='license_app_exportjob_download',
+            ),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        job = get_object_or_404(ExportJob, pk=pk, status='done')
+        if not self.has_view_permission(request, job):
+            raise Http404
+        try:
+            return FileResponse(open(job.file_path, 'rb'), as_attachment=True)
+        except FileNotFoundError:
+            raise Http404("Le fichier d'export n'existe plus.")
+
+    def progress_display(self, obj):
+        return f"{obj.progress()} % ({obj.processed}/{obj.total})"
+    progress_display.short_description = "Progression"
+
+    def download_link(self, obj):
+        if obj.status != 'done':
+            return "-"
+        url = reverse('admin:license_app_exportjob_download', args=[obj.pk])
+        return format_html('<a href="{}">📥 Télécharger</a>', url)
+    download_link.short_description = "Fichier"
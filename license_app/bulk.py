@@ -0,0 +1,247 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DateField, ExpressionWrapper, F, Model, Value, When
+from django.utils import timezone
+
+from .cache import license_cache
+from .history import compact_history, compact_record, tracked_fields
+from .models import License, LicenseEvent
+
+
+logger = logging.getLogger(__name__)
+
+
+def _chunk_size(chunk_size):
+    return chunk_size or getattr(settings, 'LICENSE_BULK_CHUNK_SIZE', 1000)
+
+
+def _batch_size(batch_size):
+    return batch_size or getattr(settings, 'LICENSE_BULK_BATCH_SIZE', 500)
+
+
+def run_in_chunks(queryset, fields, apply_chunk, chunk_size=None, progress=None, label='bulk'):
+    """
+    Shared executor of the bulk operations: reads ``queryset`` as values()
+    rows (primary key included) in primary key order, ``chunk_size`` at a
+    time, and calls ``apply_chunk(rows)`` for each chunk inside its own
+    transaction, so locks are held for one chunk only and what is done stays
+    committed.
+
+    Chunks are walked by primary key (keyset) rather than with iterator(): the
+    rows are updated while the selection is read, and on SQLite an open
+    iterator cursor would see its own writes and keep a read open across
+    every chunk. ``apply_chunk`` returns the number of rows it handled.
+
+    After each chunk, progress is logged and ``progress(processed, total)``
+    is called when given. Returns the number of rows processed.
+    """
+    chunk_size = _chunk_size(chunk_size)
+    pk_name = queryset.model._meta.pk.attname
+    if pk_name not in fields:
+        fields = [pk_name, *fields]
+    queryset = queryset.order_by('pk')
+    total = queryset.count() if progress else None
+    processed = 0
+    last_pk = 0
+
+    while True:
+        with transaction.atomic():
+            rows = list(queryset.filter(pk__gt=last_pk).values(*fields)[:chunk_size])
+            if not rows:
+                break
+            last_pk = rows[-1][pk_name]
+            processed += apply_chunk(rows)
+
+        logger.info("%s: %d license(s) processed", label, processed)
+        if progress:
+            progress(processed, total)
+
+    return processed
+
+
+def _tracked_fields():
+    """Attribute names of the License columns copied into HistoricalLicense."""
+    return [field.attname for field in License._meta.concrete_fields]
+
+
+def _column_values(updates):
+    """Turn ``{'product': <Product>}`` style updates into ``{'product_id': 3}`` column values."""
+    values = {}
+    for name, value in updates.items():
+        field = License._meta.get_field(name)
+        if hasattr(value, 'resolve_expression'):
+            continue
+        if isinstance(value, Model):
+            value = value.pk
+        values[field.attname] = value
+    return values
+
+
+def update_with_history(
+    queryset, updates, user=None, reason=None, chunk_size=None, batch_size=None, progress=None, after_chunk=None,
+):
+    """
+    Apply the same ``updates`` to every license of ``queryset`` and write the
+    matching HistoricalLicense rows.
+
+    Runs through run_in_chunks(): each chunk is one values() SELECT, one
+    UPDATE and bulk INSERTs of ``batch_size`` history rows, in its own short
+    transaction, so no model instance is built. Updates may be SQL
+    expressions (F(), Case, Concat...); the chunk is then read back once after
+    the UPDATE so that history holds the computed values. ``user`` and
+    ``reason`` are recorded as history_user and history_change_reason.
+    ``after_chunk(pks, now)`` is called in the chunk transaction, after the
+    history rows are written. The UPDATE re-applies the filter of
+    ``queryset``, and history rows and after_chunk() only cover the licenses
+    it matched. Returns the number of licenses updated.
+
+    In delta history mode only the primary keys are read, and the history
+    rows only hold the updated columns (computed ones are read back alone).
+    """
+    HistoricalLicense = License.history.model
+    fields = _tracked_fields()
+    values = _column_values(updates)
+    computed = sorted({License._meta.get_field(name).attname for name in updates} - set(values))
+    compact = compact_history()
+    if compact:
+        empty = dict.fromkeys(tracked_fields(HistoricalLicense))
+        delta = sorted({*values, *computed, 'updated_at'})
+        fields = ['id']
+    else:
+        empty = {}
+        delta = None
+
+    def apply_chunk(rows):
+        now = timezone.now()
+        pks = [row['id'] for row in rows]
+        # The caller's filter is applied again: a license changed since the chunk was read
+        # (reactivated before being expired, say) is left alone and gets no history row
+        matched = queryset.filter(pk__in=pks).update(**updates, updated_at=now)
+        if matched != len(pks):
+            # The rows this UPDATE matched are the ones it stamped with ``now``
+            pks = list(License.objects.filter(pk__in=pks, updated_at=now).order_by('pk').values_list('pk', flat=True))
+            kept = set(pks)
+            rows = [row for row in rows if row['id'] in kept]
+        if computed:
+            read_back = ['id', *computed] if compact else fields
+            rows = list(License.objects.filter(pk__in=pks).order_by('pk').values(*read_back))
+        HistoricalLicense.objects.bulk_create(
+            [
+                HistoricalLicense(
+                    **{**empty, **row, **values, 'updated_at': now},
+                    history_delta=delta,
+                    history_date=now,
+                    history_type='~',
+                    history_user=user,
+                    history_change_reason=reason,
+                )
+                for row in rows
+            ],
+            batch_size=_batch_size(batch_size),
+        )
+        if after_chunk:
+            after_chunk(pks, now)
+        return len(rows)
+
+    updated = run_in_chunks(
+        queryset, fields, apply_chunk, chunk_size=chunk_size, progress=progress, label=reason or 'bulk update',
+    )
+    if updated:
+        # Clears the lookup cache of this process only. For a job queued to
+        # run_worker, that is the worker's cache: the web processes keep
+        # serving the old rows for up to LICENSE_CACHE_TIMEOUT seconds.
+        license_cache.clear()
+    return updated
+
+
+def write_history(objs, history_type, user=None, reason=None, date=None, batch_size=None):
+    """
+    Bulk insert the HistoricalLicense rows of licenses written with
+    bulk_create ('+') or bulk_update ('~'), which skip simple_history.
+    Call it in the transaction of the write. In delta history mode, '~'
+    records are reduced by compact_record() like the ones save() writes.
+    """
+    HistoricalLicense = License.history.model
+    date = date or timezone.now()
+    records = []
+    for obj in objs:
+        record = HistoricalLicense(
+            **{field.attname: getattr(obj, field.attname) for field in HistoricalLicense.tracked_fields},
+            history_date=date,
+            history_type=history_type,
+            history_user=user,
+            history_change_reason=reason,
+        )
+        compact_record(HistoricalLicense, obj, record)
+        records.append(record)
+    HistoricalLicense.objects.bulk_create(records, batch_size=_batch_size(batch_size))
+    return records
+
+
+def extend_licenses(queryset, days, user=None, reason=None, **options):
+    """
+    Set-based License.extend_validity(): push expiry dates back by ``days`` in
+    SQL and expire the licenses whose new expiry date is still in the past.
+    Licenses without an expiry date are left untouched.
+    """
+    today = timezone.now().date()
+    return update_with_history(
+        queryset.filter(expiry_date__isnull=False),
+        {
+            'expiry_date': ExpressionWrapper(F('expiry_date') + timedelta(days=days), output_field=DateField()),
+            # SET expressions see the old value: old + days < today  <=>  old < today - days
+            'status': Case(
+                When(expiry_date__lt=today - timedelta(days=days), then=Value('expired')),
+                default=F('status'),
+            ),
+        },
+        user=user,
+        reason=reason,
+        **options,
+    )
+
+
+def set_licenses_expiry(queryset, expiry_date, user=None, reason=None, **options):
+    """Set-based equivalent of assigning expiry_date and calling _update_status_from_expiry()."""
+    updates = {'expiry_date': expiry_date}
+    if expiry_date < timezone.now().date():
+        updates['status'] = 'expired'
+    return update_with_history(queryset, updates, user=user, reason=reason, **options)
+
+
+def change_licenses_status(queryset, status, comment=None, user=None, reason=None, batch_size=None, **options):
+    """
+    Set-based License.change_status(): one LicenseEvent per license is
+    inserted in bulk with each chunk.
+    """
+    def record_events(pks, now):
+        LicenseEvent.objects.bulk_create(
+            [
+                LicenseEvent(license_id=pk, status=status, author=user, created_at=now, message=comment or '')
+                for pk in pks
+            ],
+            batch_size=_batch_size(batch_size),
+        )
+
+    return update_with_history(
+        queryset, {'status': status},
+        user=user, reason=reason, batch_size=batch_size, after_chunk=record_events, **options,
+    )
+
+
+def expire_overdue_licenses(today=None, chunk_size=None, reason="Expiration automatique"):
+    """
+    Mark every active license whose expiry date is past as expired, with
+    history, without loading model instances (see update_with_history).
+    Returns the number of licenses expired.
+    """
+    today = today or timezone.now().date()
+    return update_with_history(
+        License.objects.filter(status='active', expiry_date__lt=today),
+        {'status': 'expired'},
+        reason=reason,
+        chunk_size=chunk_size,
+    )
@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+_MISSING = object()
+
+
+class LicenseLookupCache:
+    """
+    Bounded in-process LRU cache of license lookups, keyed by license number.
+
+    Entries are invalidated when a License is saved or deleted (see signals.py)
+    and also expire after ``timeout`` seconds, which bounds staleness across
+    worker processes and after updates that bypass model signals.
+    """
+
+    def __init__(self, maxsize=10000, timeout=300):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._keys_by_pk = {}
+        self._lock = threading.Lock()
+
+    def get(self, license_number, default=None):
+        with self._lock:
+            entry = self._data.get(license_number, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, pk, value = entry
+            if expires_at < time.monotonic():
+                self._evict(license_number)
+                return default
+            self._data.move_to_end(license_number)
+            return value
+
+    def set(self, license_number, value, pk=None):
+        with self._lock:
+            if license_number in self._data:
+                self._evict(license_number)
+            self._data[license_number] = (time.monotonic() + self.timeout, pk, value)
+            if pk is not None:
+                self._keys_by_pk[pk] = license_number
+            while len(self._data) > self.maxsize:
+                self._evict(next(iter(self._data)))
+
+    def invalidate(self, license_number=None, pk=None):
+        with self._lock:
+            if pk is not None and pk in self._keys_by_pk:
+                self._evict(self._keys_by_pk[pk])
+            if license_number is not None and license_number in self._data:
+                self._evict(license_number)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._keys_by_pk.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _evict(self, license_number):
+        _, pk, _ = self._data.pop(license_number)
+        if pk is not None and self._keys_by_pk.get(pk) == license_number:
+            del self._keys_by_pk[pk]
+
+
+license_cache = LicenseLookupCache(
+    maxsize=getattr(settings, 'LICENSE_CACHE_SIZE', 10000),
+    timeout=getattr(settings, 'LICENSE_CACHE_TIMEOUT', 300),
+)
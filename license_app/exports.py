@@ -0,0 +1,134 @@
+import csv
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ExportJob, License
+from .selection import selection_queryset
+
+
+EXPORT_HEADER = ['Numéro', 'Client', 'Produit', 'Début', 'Expiration', 'Statut', 'Jours restants']
+
+
+def export_rows(queryset, chunk_size=2000):
+    """Yield one list of values per license, reading the queryset in chunks with customer and product joined."""
+    today = timezone.now().date()
+    status_labels = dict(License.STATUS)
+    for license in queryset.select_related('customer', 'product').iterator(chunk_size=chunk_size):
+        days = (license.expiry_date - today).days if license.expiry_date else None
+        yield [
+            license.license_number,
+            str(license.customer),
+            str(license.product) if license.product else '',
+            license.start_date,
+            license.expiry_date,
+            status_labels.get(license.status, license.status),
+            'N/A' if days is None else days,
+        ]
+
+
+def create_export_job(selection, format, user=None):
+    """Queue an export of the licenses described by ``selection`` (see selection.describe_selection)."""
+    return ExportJob.objects.create(
+        format=format,
+        selection=selection,
+        created_by=user,
+    )
+
+
+def export_queryset(job):
+    return selection_queryset(job.selection)
+
+
+def _write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_HEADER)
+        for row in rows:
+            writer.writerow(row)
+            yield
+
+
+def _write_xlsx(path, rows):
+    from openpyxl import Workbook
+
+    # Write-only mode streams rows to disk instead of keeping the sheet in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Licences")
+    sheet.append(EXPORT_HEADER)
+    for row in rows:
+        sheet.append(row)
+        yield
+    workbook.save(path)
+
+
+def _write_parquet(path, rows, chunk_size=50000):
+    import pandas as pd
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("L'export Parquet nécessite le paquet 'pyarrow'.")
+
+    writer = None
+    chunk = []
+
+    def flush():
+        nonlocal writer
+        frame = pd.DataFrame(chunk, columns=EXPORT_HEADER).astype({'Jours restants': 'string'})
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(path, table.schema)
+        writer.write_table(table)
+        chunk.clear()
+
+    try:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                flush()
+            yield
+        if chunk or writer is None:
+            flush()
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+WRITERS = {
+    'csv': _write_csv,
+    'xlsx': _write_xlsx,
+    'parquet': _write_parquet,
+}
+
+
+def run_export_job(job, progress_every=5000):
+    """
+    Write the export file of a claimed job, recording progress as it goes.
+    The final status is only written while the job is still running: a job
+    failed by jobs.fail_stale_jobs() in the meantime stays failed.
+    """
+    export_root = Path(getattr(settings, 'LICENSE_EXPORT_ROOT', settings.BASE_DIR / 'exports'))
+    export_root.mkdir(parents=True, exist_ok=True)
+    path = export_root / f"licences_{job.pk}_{timezone.now():%Y%m%d_%H%M%S}.{job.format}"
+
+    queryset = export_queryset(job)
+    ExportJob.objects.filter(pk=job.pk).update(total=queryset.count(), heartbeat_at=timezone.now())
+
+    running = ExportJob.objects.filter(pk=job.pk, status='running')
+    processed = 0
+    try:
+        for _ in WRITERS[job.format](path, export_rows(queryset)):
+            processed += 1
+            if processed % progress_every == 0:
+                ExportJob.objects.filter(pk=job.pk).update(processed=processed, heartbeat_at=timezone.now())
+    except Exception as e:
+        path.unlink(missing_ok=True)
+        running.update(status='failed', error=str(e), processed=processed, finished_at=timezone.now())
+        return False
+
+    if not running.update(status='done', processed=processed, file_path=str(path), finished_at=timezone.now()):
+        path.unlink(missing_ok=True)
+        return False
+    return True
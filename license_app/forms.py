@@ -1,6 +1,6 @@
 from django import forms
 from django.utils import timezone
-from .models import Product, License
+from .models import Product, License, ExportJob
 
 class SetProductForm(forms.Form):
     new_product = forms.ModelChoiceField(
@@ -24,6 +24,14 @@ class BulkStatusForm(forms.Form):
     )
 
 
+class ExportJobForm(forms.Form):
+    format = forms.ChoiceField(
+        choices=ExportJob.FORMATS,
+        label="Format du fichier",
+        required=True,
+    )
+
+
 class BulkUpdateDatesForm(forms.Form):
 
     ACTION_EXTEND = 'extend'
@@ -36,7 +44,8 @@ class BulkUpdateDatesForm(forms.Form):
         (ACTION_SET_EXPIRY, "⏰ Définir la date d'expiration"),
     )
 
-    action = forms.ChoiceField(
+    # Not named "action": that POST parameter already carries the admin action name
+    date_action = forms.ChoiceField(
         choices=ACTION_CHOICES,
         label="Action à effectuer",
         widget=forms.RadioSelect,
@@ -68,7 +77,7 @@ class BulkUpdateDatesForm(forms.Form):
 
     def clean(self):
         cleaned = super().clean()
-        action = cleaned.get('action')
+        action = cleaned.get('date_action')
 
         if action == self.ACTION_EXTEND and not cleaned.get('extension_days'):
             self.add_error('extension_days', "Ce champ est obligatoire.")
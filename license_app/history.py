@@ -0,0 +1,122 @@
+from django.conf import settings
+from django.db import models
+from simple_history.models import HistoricalRecords
+
+
+def compact_history():
+    """True when changes are recorded as deltas (LICENSE_HISTORY_MODE = 'delta')."""
+    return getattr(settings, 'LICENSE_HISTORY_MODE', 'full') == 'delta'
+
+
+def tracked_fields(history_model):
+    """Attribute names of the tracked columns a delta record may leave empty (all but the object id)."""
+    model = history_model.instance_type
+    return [field.attname for field in model._meta.concrete_fields if not field.primary_key]
+
+
+class DeltaHistoryModel(models.Model):
+    """
+    Base of historical models written by DeltaHistoricalRecords.
+
+    ``history_delta`` is None for a full record, otherwise the list of the
+    columns the record stores; the other columns are left NULL and are
+    rebuilt from the older records by hydrate().
+    """
+
+    history_delta = models.JSONField(null=True, blank=True, verbose_name="Champs modifiés")
+
+    class Meta:
+        abstract = True
+
+    @property
+    def is_delta(self):
+        return self.history_delta is not None
+
+
+class DeltaHistoricalRecords(HistoricalRecords):
+    """
+    HistoricalRecords able to store changes as deltas: the copied columns are
+    nullable so that a change only fills the fields it modified. Creations
+    and deletions are always full records. ``record.instance`` (used by
+    as_of() and the admin history form) rebuilds the full version first.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('bases', [DeltaHistoryModel])
+        super().__init__(*args, **kwargs)
+
+    def copy_fields(self, model):
+        fields = super().copy_fields(model)
+        for name, field in fields.items():
+            if name != model._meta.pk.name:
+                field.null = True
+        return fields
+
+    def get_extra_fields(self, model, fields):
+        extra_fields = super().get_extra_fields(model, fields)
+        get_instance = extra_fields['instance'].fget
+
+        def instance(record):
+            hydrate([record])
+            return get_instance(record)
+
+        extra_fields['instance'] = property(instance)
+        return extra_fields
+
+
+def compact_record(sender, instance, history_instance, **kwargs):
+    """
+    pre_create_historical_record receiver: reduce a change record to the
+    fields that differ from the values the instance was loaded with (see
+    License.from_db). Without those values a full record is kept.
+    """
+    loaded = getattr(instance, '_loaded_values', None)
+    if history_instance.history_type != '~' or loaded is None or not compact_history():
+        return
+    changed = []
+    for name in tracked_fields(sender):
+        if name in loaded and getattr(history_instance, name) == loaded[name]:
+            setattr(history_instance, name, None)
+        else:
+            changed.append(name)
+    history_instance.history_delta = changed
+
+
+def hydrate(records):
+    """
+    Rebuild in place the full version of the delta records among ``records``,
+    from the older records of the same object down to its last full record.
+    Runs one query per object.
+    """
+    pending = {}
+    for record in records:
+        if record.is_delta and not getattr(record, '_hydrated', False):
+            pending.setdefault((type(record), record.id), []).append(record)
+
+    for (history_model, object_id), object_records in pending.items():
+        fields = tracked_fields(history_model)
+        newest = max(record.history_id for record in object_records)
+        oldest = min(record.history_id for record in object_records)
+        chain = []
+        for row in (
+            history_model.objects.filter(id=object_id, history_id__lte=newest)
+            .order_by('-history_id')
+            .values('history_id', 'history_delta', *fields)
+            .iterator()
+        ):
+            chain.append(row)
+            if row['history_delta'] is None and row['history_id'] <= oldest:
+                break
+
+        state = {}
+        versions = {}
+        for row in reversed(chain):
+            changed = fields if row['history_delta'] is None else row['history_delta']
+            state.update({name: row[name] for name in changed})
+            versions[row['history_id']] = dict(state)
+
+        for record in object_records:
+            for name, value in versions.get(record.history_id, {}).items():
+                setattr(record, name, value)
+            record._hydrated = True
+    return records
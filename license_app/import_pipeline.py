@@ -0,0 +1,210 @@
+import csv
+import json
+from itertools import islice
+from pathlib import Path
+
+import tablib
+from django.conf import settings
+
+from .import_validation import check_chunk, check_references, check_repeats
+from .resources import LicenseResource
+
+
+class ImportAborted(Exception):
+    """Raised when a chunk fails; every chunk before it is already committed."""
+
+    def __init__(self, message, rows_committed):
+        super().__init__(message)
+        self.rows_committed = rows_committed
+
+
+def _blank_row(row):
+    return all(value is None or str(value).strip() == '' for value in row)
+
+
+def read_csv(path):
+    """
+    Return the header and a lazy iterator over the ``(line, row)`` pairs of a
+    CSV file, ``line`` being the line the row starts on. Blank rows are skipped.
+    """
+    f = open(path, newline='', encoding='utf-8-sig')
+    reader = csv.reader(f)
+    headers = next(reader, [])
+
+    def rows():
+        with f:
+            line = reader.line_num + 1
+            for row in reader:
+                # A quoted value may span several lines: line_num is the last one read
+                if not _blank_row(row):
+                    yield line, row
+                line = reader.line_num + 1
+    return headers, rows()
+
+
+def read_xlsx(path):
+    """
+    Return the header and a lazy iterator over the ``(line, row)`` pairs of
+    the first sheet of an XLSX file. Blank rows are skipped.
+    """
+    from openpyxl import load_workbook
+
+    # read_only streams the sheet instead of loading it whole
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    sheet_rows = workbook.worksheets[0].iter_rows(values_only=True)
+    headers = [str(h).strip() if h is not None else '' for h in next(sheet_rows, ())]
+
+    def rows():
+        try:
+            for line, row in enumerate(sheet_rows, start=2):
+                if not _blank_row(row):
+                    yield line, row
+        finally:
+            workbook.close()
+    return headers, rows()
+
+
+READERS = {
+    '.csv': read_csv,
+    '.xlsx': read_xlsx,
+}
+
+
+class Checkpoint:
+    """
+    Sidecar JSON file recording how many rows of a file are committed, and
+    the license number of the last one so that a resume can check that the
+    rows before it were not changed in the meantime.
+    """
+
+    def __init__(self, path):
+        self.source = Path(path)
+        self.path = self.source.with_name(self.source.name + '.checkpoint')
+
+    def load(self):
+        try:
+            data = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            return 0, None
+        return data.get('rows', 0), data.get('last')
+
+    def save(self, rows, last):
+        self.path.write_text(json.dumps({'rows': rows, 'last': last}))
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def checked_chunks(headers, rows, chunk_size):
+    """
+    Yield ``(lines, errors, references, rows)`` for each chunk of the
+    ``(line, row)`` pairs of a reader, in file order.
+    """
+    for chunk in chunked(rows, chunk_size):
+        lines = [line for line, _ in chunk]
+        yield (lines, *check_chunk(headers, [row for _, row in chunk], lines=lines))
+
+
+def stream_import(path, chunk_size=None, resume=False, on_chunk=None):
+    """
+    Import a CSV or XLSX file of licenses with bounded memory.
+
+    Rows are read lazily and imported chunk by chunk, each chunk in its own
+    short transaction that is rolled back entirely if any of its rows fails.
+    Every chunk first goes through the vectorized validation stage, which
+    reports all of its errors at once before anything is written.
+    After each committed chunk a checkpoint is written, so that with
+    ``resume=True`` a failed import restarts after the last committed chunk.
+    Returns the accumulated totals (new, update, skip, ...).
+    """
+    path = Path(path)
+    reader = READERS.get(path.suffix.lower())
+    if reader is None:
+        raise ImportAborted(f"Format de fichier non supporté : {path.suffix}", 0)
+
+    chunk_size = chunk_size or getattr(settings, 'LICENSE_IMPORT_CHUNK_SIZE', 1000)
+    checkpoint = Checkpoint(path)
+    done, last = checkpoint.load() if resume else (0, None)
+
+    headers, rows = reader(path)
+    try:
+        id_column = headers.index('license_number')
+    except ValueError:
+        raise ImportAborted("Colonne 'license_number' manquante.", 0)
+
+    # License numbers of the rows before the current chunk, a number may only appear once
+    seen = set()
+    if done:
+        skipped = 0
+        for skipped, (_, row) in enumerate(islice(rows, done), 1):
+            number = str(row[id_column]).strip() if len(row) > id_column and row[id_column] is not None else ''
+            seen.add(number)
+        if skipped < done or number != last:
+            raise ImportAborted("Le fichier a changé avant le point de reprise, relancez sans --resume.", 0)
+
+    resource = LicenseResource()
+    totals = {}
+
+    for lines, errors, references, chunk in checked_chunks(headers, rows, chunk_size):
+        errors += check_repeats(chunk, lines, id_column, seen)
+        errors = sorted(errors + check_references(references), key=lambda error: error.number)
+        if errors:
+            raise ImportAborted("\n".join(str(error) for error in errors), done)
+
+        dataset = tablib.Dataset(*chunk, headers=headers)
+        result = resource.import_data(
+            dataset,
+            dry_run=False,
+            use_transactions=True,
+            rollback_on_validation_errors=True,
+            reuse_lookups=bool(totals),
+        )
+        if result.has_errors() or result.has_validation_errors():
+            raise ImportAborted(_describe_errors(result, lines), done)
+
+        done += len(chunk)
+        checkpoint.save(done, str(chunk[-1][id_column]))
+        for key, value in result.totals.items():
+            totals[key] = totals.get(key, 0) + value
+        if on_chunk:
+            on_chunk(done, totals)
+
+    checkpoint.clear()
+    return totals
+
+
+def validate_file(path, chunk_size=None):
+    """Run the validation stage over a whole file without importing it; returns every error found."""
+    path = Path(path)
+    reader = READERS.get(path.suffix.lower())
+    if reader is None:
+        raise ImportAborted(f"Format de fichier non supporté : {path.suffix}", 0)
+
+    chunk_size = chunk_size or getattr(settings, 'LICENSE_IMPORT_CHUNK_SIZE', 1000)
+    headers, rows = reader(path)
+    id_column = headers.index('license_number') if 'license_number' in headers else None
+    seen = set()
+    errors = []
+    for lines, chunk_errors, references, chunk in checked_chunks(headers, rows, chunk_size):
+        if id_column is not None:
+            chunk_errors += check_repeats(chunk, lines, id_column, seen)
+        errors.extend(sorted(chunk_errors + check_references(references), key=lambda error: error.number))
+    return errors
+
+
+def _describe_errors(result, lines):
+    """Errors of an import_data() result, its 1-based row numbers turned into file lines."""
+    messages = []
+    for number, errors in result.row_errors():
+        messages.extend(f"Ligne {lines[number - 1]}: {error.error}" for error in errors)
+    for row in result.invalid_rows:
+        messages.append(f"Ligne {lines[row.number - 1]}: {row.error_dict}")
+    for error in result.base_errors:
+        messages.append(str(error.error))
+    return "\n".join(messages)
@@ -0,0 +1,169 @@
+import pandas as pd
+
+from .models import Customer, License, Product
+
+
+# Stays below SQLite's historical limit of 999 bound parameters per query
+LOOKUP_CHUNK_SIZE = 500
+
+
+class RowError:
+    def __init__(self, number, field, message):
+        self.number = number
+        self.field = field
+        self.message = message
+
+    def __str__(self):
+        return f"Ligne {self.number} ({self.field}): {self.message}"
+
+
+def _blank(series):
+    return series.isna() | (series.astype(str).str.strip() == '')
+
+
+def _ids(series):
+    """
+    Normalise foreign key values to strings (spreadsheets turn 12 into 12.0).
+    Returns the values and the mask of the non-integral numbers, such as 1.7.
+    """
+    numeric = pd.to_numeric(series, errors='coerce')
+    integral = numeric.notna() & (numeric % 1 == 0)
+    as_int = numeric[integral].astype('int64').astype(str)
+    return series.astype(str).str.strip().where(~integral, as_int), numeric.notna() & ~integral
+
+
+def _existing_pks(model, values):
+    values = [v for v in values if v.isdigit()]
+    found = set()
+    for i in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        found.update(
+            str(pk) for pk in model.objects.filter(pk__in=values[i:i + LOOKUP_CHUNK_SIZE]).values_list('pk', flat=True)
+        )
+    return found
+
+
+def check_chunk(headers, rows, offset=0, lines=None):
+    """
+    Database-free part of the validation: checks a chunk of import rows in
+    vectorized form (License.clean() date rule, License.STATUS choices,
+    duplicate license numbers within the chunk) and normalises it: strings are stripped, dates written as ISO strings and
+    foreign keys as plain integer strings. Errors are numbered by ``lines``,
+    the line of each row in the source file, or else from ``offset`` + 1.
+
+    Returns ``(errors, references, rows)`` where ``references`` maps
+    'customer' and 'product' to ``{id: [row numbers]}`` for check_references().
+    """
+    lines = list(lines) if lines is not None else range(offset + 1, offset + 1 + len(rows))
+    errors = []
+
+    # Rows narrower than the header, or with values past its last column, are
+    # reported; they are padded or cut so that the other checks still run
+    width = len(headers)
+    fitted = []
+    for number, row in zip(lines, rows):
+        row = list(row)
+        if len(row) < width or any(value is not None and str(value).strip() != '' for value in row[width:]):
+            errors.append(RowError(number, 'colonnes', f"{len(row)} colonne(s) au lieu de {width}."))
+        fitted.append((row + [None] * width)[:width])
+
+    frame = pd.DataFrame(fitted, columns=headers, dtype=object)
+    frame.index = lines
+
+    def report(mask, field, message):
+        for number in frame.index[mask]:
+            errors.append(RowError(number, field, message))
+
+    if 'license_number' not in frame:
+        return [RowError(lines[0] if lines else offset + 1, 'license_number', "Colonne manquante.")], {}, rows
+
+    for column in frame:
+        is_text = frame[column].map(lambda value: isinstance(value, str)).astype(bool)
+        frame.loc[is_text, column] = frame.loc[is_text, column].str.strip()
+
+    numbers = frame['license_number'].astype(str)
+    report(_blank(frame['license_number']), 'license_number', "Numéro de licence manquant.")
+    report(~_blank(frame['license_number']) & numbers.duplicated(keep=False), 'license_number', "Numéro de licence en double dans le fichier.")
+
+    dates = {}
+    for field in ('start_date', 'expiry_date'):
+        if field in frame:
+            blank = _blank(frame[field])
+            dates[field] = pd.to_datetime(frame[field].where(~blank), errors='coerce', format='ISO8601')
+            report(~blank & dates[field].isna(), field, "Date invalide.")
+            parsed = dates[field].notna()
+            frame.loc[parsed, field] = dates[field][parsed].dt.strftime('%Y-%m-%d')
+    if len(dates) == 2:
+        report(
+            (dates['start_date'] > dates['expiry_date']).fillna(False),
+            'start_date',
+            "La date de début ne peut pas être postérieure à la date d'expiration.",
+        )
+
+    if 'status' in frame:
+        allowed = [key for key, _ in License.STATUS]
+        blank = _blank(frame['status'])
+        report(~blank & ~frame['status'].astype(str).isin(allowed), 'status', "Statut inconnu.")
+
+    if 'customer' in frame:
+        report(_blank(frame['customer']), 'customer', "Client manquant.")
+
+    references = {}
+    for field in ('customer', 'product'):
+        if field in frame:
+            blank = _blank(frame[field])
+            ids, invalid = _ids(frame[field])
+            report(~blank & invalid, field, "Identifiant invalide.")
+            frame.loc[~blank, field] = ids[~blank]
+            used = ids[~blank & ~invalid]
+            references[field] = {
+                value: list(numbers) for value, numbers in used.groupby(used).groups.items()
+            }
+
+    frame = frame.astype(object).where(frame.notna(), None)
+    return errors, references, list(frame.itertuples(index=False, name=None))
+
+
+def check_references(references):
+    """Report unknown customers and products, with one query per model."""
+    errors = []
+    for field, model in (('customer', Customer), ('product', Product)):
+        used = references.get(field, {})
+        existing = _existing_pks(model, list(used))
+        for value, numbers in used.items():
+            if value not in existing:
+                errors.extend(
+                    RowError(number, field, f"{model._meta.verbose_name} introuvable.") for number in numbers
+                )
+    return errors
+
+
+def check_repeats(rows, lines, column, seen):
+    """
+    Report the license numbers of a chunk already used by a previous chunk of
+    the file (repeats within the chunk are reported by check_chunk()).
+    ``seen`` is the set of the numbers of the previous chunks; the numbers of
+    this chunk are added to it.
+    """
+    errors = []
+    numbers = []
+    for line, row in zip(lines, rows):
+        number = row[column]
+        if number is None or str(number) == '':
+            continue
+        number = str(number)
+        if number in seen:
+            errors.append(RowError(line, 'license_number', "Numéro de licence déjà présent plus haut dans le fichier."))
+        numbers.append(number)
+    seen.update(numbers)
+    return errors
+
+
+def validate_chunk(headers, rows, offset=0):
+    """
+    Check a chunk of import rows and return every problem found: the checks of
+    check_chunk() followed by the lookup of unknown customers and products.
+    """
+    errors, references, _ = check_chunk(headers, rows, offset)
+    errors += check_references(references)
+    errors.sort(key=lambda error: error.number)
+    return errors
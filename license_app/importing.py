@@ -0,0 +1,83 @@
+from import_export.instance_loaders import ModelInstanceLoader
+from import_export.widgets import ForeignKeyWidget
+
+
+# Stays below SQLite's historical limit of 999 bound parameters per query
+IMPORT_CHUNK_SIZE = 500
+
+
+def _key(value):
+    """Normalise an identifier read from a file (spreadsheets turn 12 into 12.0)."""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+class BulkInstanceLoader(ModelInstanceLoader):
+    """
+    Loads the existing instances of a dataset chunk by chunk, with one ``IN``
+    query per chunk instead of one lookup per row. Only the chunk being
+    imported is kept in memory.
+    """
+
+    chunk_size = IMPORT_CHUNK_SIZE
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        id_field_name = self.resource.get_import_id_fields()[0]
+        self.id_field = self.resource.fields[id_field_name]
+
+        self.chunk_of = {}
+        self.chunks = []
+        if self.dataset.headers and self.id_field.column_name in self.dataset.headers:
+            ids = list(dict.fromkeys(
+                _key(value) for value in self.dataset[self.id_field.column_name]
+                if value not in (None, '')
+            ))
+            self.chunks = [ids[i:i + self.chunk_size] for i in range(0, len(ids), self.chunk_size)]
+            self.chunk_of = {key: n for n, chunk in enumerate(self.chunks) for key in chunk}
+
+        self.loaded_chunk = None
+        self.instances = {}
+
+    def get_instance(self, row):
+        value = row.get(self.id_field.column_name)
+        if value in (None, ''):
+            return None
+        key = _key(value)
+        chunk = self.chunk_of.get(key)
+        if chunk is None:
+            return None
+        if chunk != self.loaded_chunk:
+            queryset = self.get_queryset().filter(**{f"{self.id_field.attribute}__in": self.chunks[chunk]})
+            self.instances = {_key(self.id_field.get_value(obj)): obj for obj in queryset}
+            self.loaded_chunk = chunk
+        return self.instances.get(key)
+
+
+class PreloadedForeignKeyWidget(ForeignKeyWidget):
+    """
+    ForeignKeyWidget resolving values from a dictionary loaded with a single
+    query on first use, instead of one ``get()`` per row. Call ``reset()``
+    before each import so that the dictionary is not reused across imports.
+    """
+
+    def __init__(self, model, field='pk', **kwargs):
+        super().__init__(model, field=field, **kwargs)
+        self.instances = None
+
+    def reset(self):
+        self.instances = None
+
+    def get_instance_by_lookup_fields(self, value, row, **kwargs):
+        if self.instances is None:
+            self.instances = {
+                _key(getattr(obj, self.field)): obj
+                for obj in self.get_queryset(value, row, **kwargs)
+            }
+        try:
+            return self.instances[_key(value)]
+        except KeyError:
+            raise self.model.DoesNotExist(
+                f"{self.model._meta.verbose_name} « {value} » introuvable."
+            )
@@ -0,0 +1,160 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .bulk import change_licenses_status, extend_licenses, set_licenses_expiry, update_with_history
+from .models import BulkJob, Product
+from .selection import describe_selection, selection_queryset
+
+
+def fail_stale_jobs(model, timeout=None):
+    """
+    Mark as failed the running jobs of ``model`` that made no progress for
+    ``timeout`` seconds (LICENSE_JOB_TIMEOUT): their worker died before the
+    end. Progress is the heartbeat_at time the worker updates after each
+    chunk, or started_at before the first one. Failed jobs are not run
+    again, since the chunks committed before the crash would be applied
+    twice (a date extension for instance); ``model.STALE_ERROR`` tells the
+    user so. Returns the number of jobs marked failed.
+    """
+    timeout = timeout or getattr(settings, 'LICENSE_JOB_TIMEOUT', 3600)
+    now = timezone.now()
+    limit = now - timedelta(seconds=timeout)
+    return model.objects.filter(
+        Q(heartbeat_at__lt=limit) | Q(heartbeat_at__isnull=True, started_at__lt=limit),
+        status='running',
+    ).update(status='failed', error=model.STALE_ERROR, finished_at=now)
+
+
+def claim_next(model):
+    """
+    Move the oldest pending job of ``model`` to running and return it, or
+    return None when there is nothing to do.
+
+    Backends with SELECT ... FOR UPDATE SKIP LOCKED let concurrent workers
+    skip the rows another worker is claiming. SQLite has neither row locks nor
+    SKIP LOCKED: there a conditional UPDATE claims the job, and only the
+    worker whose UPDATE matched the pending row gets it.
+
+    Jobs left running by a dead worker are marked failed first, see
+    fail_stale_jobs().
+    """
+    fail_stale_jobs(model)
+    pending = model.objects.filter(status='pending').order_by('created_at')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = pending.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status = 'running'
+            job.started_at = job.heartbeat_at = timezone.now()
+            job.save(update_fields=['status', 'started_at', 'heartbeat_at'])
+            return job
+
+    for pk in pending.values_list('pk', flat=True)[:10]:
+        now = timezone.now()
+        claimed = model.objects.filter(pk=pk, status='pending').update(
+            status='running', started_at=now, heartbeat_at=now
+        )
+        if claimed:
+            return model.objects.get(pk=pk)
+    return None
+
+
+def set_product(queryset, params, user=None, progress=None):
+    product = Product.objects.get(pk=params['product'])
+    updated = update_with_history(
+        queryset, {'product': product},
+        user=user, reason="Modification du produit en masse", progress=progress,
+    )
+    return f"✅ {updated} licence(s) mise(s) à jour avec le produit « {product} »."
+
+
+def update_dates(queryset, params, user=None, progress=None):
+    action = params['date_action']
+
+    if action == 'extend':
+        days = params['extension_days']
+        updated = extend_licenses(
+            queryset, days,
+            user=user, reason=f"Prolongation de {days} jours", progress=progress,
+        )
+        return f"✅ {updated} licence(s) prolongée(s) de {days} jours."
+
+    if action == 'set_start':
+        # No business logic side effect on start_date, so a set-based update is fine and efficient
+        updated = update_with_history(
+            queryset, {'start_date': date.fromisoformat(params['start_date'])},
+            user=user, reason="Modification de la date de début en masse", progress=progress,
+        )
+    else:
+        # Setting expiry date affects status, which set_licenses_expiry applies in the same UPDATE
+        updated = set_licenses_expiry(
+            queryset, date.fromisoformat(params['expiry_date']),
+            user=user, reason="Modification de la date d'expiration en masse", progress=progress,
+        )
+    return f"✅ {updated} licence(s) mise(s) à jour."
+
+
+def change_status(queryset, params, user=None, progress=None):
+    updated = change_licenses_status(
+        queryset, params['status'], params.get('comment'),
+        user=user, reason="Changement de statut en masse", progress=progress,
+    )
+    return f"✅ {updated} licence(s) mise(s) à jour."
+
+
+# BulkJob.action -> operation(queryset, params, user, progress) returning the result message
+OPERATIONS = {
+    'set_product': set_product,
+    'bulk_update_dates': update_dates,
+    'bulk_change_status': change_status,
+}
+
+
+def run_or_queue(queryset, action, params, user=None, request=None):
+    """
+    Run a bulk operation now, or queue it as a BulkJob for run_worker when
+    the selection is larger than LICENSE_BULK_JOB_THRESHOLD. The job stores
+    the selection described by selection.describe_selection(), ``request``
+    being the admin action request.
+
+    Returns ``(message, job)``: the result message when the operation ran,
+    the queued job otherwise. A queued job cannot clear the lookup cache of
+    the web processes: the validation API sees its changes after at most
+    LICENSE_CACHE_TIMEOUT seconds.
+    """
+    threshold = getattr(settings, 'LICENSE_BULK_JOB_THRESHOLD', 1000)
+    if threshold is not None and queryset.count() > threshold:
+        job = BulkJob.objects.create(
+            action=action,
+            params=params,
+            selection=describe_selection(queryset, request),
+            created_by=user,
+        )
+        return None, job
+    return OPERATIONS[action](queryset, params, user=user), None
+
+
+def run_bulk_job(job):
+    """
+    Run a claimed BulkJob, recording progress after each committed chunk.
+    The final status is only written while the job is still running: a job
+    failed by fail_stale_jobs() in the meantime stays failed.
+    """
+    def progress(processed, total):
+        BulkJob.objects.filter(pk=job.pk).update(processed=processed, total=total, heartbeat_at=timezone.now())
+
+    running = BulkJob.objects.filter(pk=job.pk, status='running')
+    try:
+        queryset = selection_queryset(job.selection)
+        result = OPERATIONS[job.action](queryset, job.params, user=job.created_by, progress=progress)
+    except Exception as e:
+        running.update(status='failed', error=str(e), finished_at=timezone.now())
+        return False
+
+    return bool(running.update(status='done', result=result, finished_at=timezone.now()))
@@ -0,0 +1,68 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.mail import get_connection
+
+
+class RateLimiter:
+    """Spaces out calls so that at most ``rate`` messages are released per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self, count=1):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval * count
+        if start > now:
+            time.sleep(start - now)
+
+
+class DeliveryReport:
+    def __init__(self):
+        self.sent = 0
+        self.failed = []  # (message, error) pairs
+        self._lock = threading.Lock()
+
+    def add(self, sent, failed):
+        with self._lock:
+            self.sent += sent
+            self.failed.extend(failed)
+
+
+def deliver_messages(messages, batch_size=100, concurrency=1, rate_limit=None):
+    """
+    Send EmailMessage objects in batches, reusing one backend connection per batch.
+
+    With ``concurrency`` > 1 the batches are spread over a thread pool, each
+    worker opening its own connection. ``rate_limit`` caps the number of
+    messages released per second across all workers. A failing batch does not
+    stop the others; its messages are reported in ``DeliveryReport.failed``.
+    """
+    report = DeliveryReport()
+    limiter = RateLimiter(rate_limit)
+    batches = [messages[i:i + batch_size] for i in range(0, len(messages), batch_size)]
+
+    def send_batch(batch):
+        limiter.wait(len(batch))
+        try:
+            with get_connection(fail_silently=False) as connection:
+                sent = connection.send_messages(batch) or 0
+        except Exception as e:
+            report.add(0, [(message, e) for message in batch])
+        else:
+            report.add(sent, [])
+
+    if concurrency > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(send_batch, batches))
+    else:
+        for batch in batches:
+            send_batch(batch)
+    return report
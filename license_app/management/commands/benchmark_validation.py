@@ -0,0 +1,118 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+from license_app.cache import license_cache
+from license_app.models import License
+
+
+def _wsgi_get(application, path):
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(),
+        'wsgi.errors': BytesIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    status = []
+    body = b''.join(application(environ, lambda s, h, exc_info=None: status.append(s)))
+    return status[0], body
+
+
+async def _asgi_get(application, path):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'headers': [(b'host', b'localhost')],
+        'server': ('localhost', 80),
+    }
+    messages = []
+    request_sent = False
+    response_done = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Like a real server, only report the disconnect once the response is sent
+        await response_done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        messages.append(message)
+        if message['type'] == 'http.response.body' and not message.get('more_body'):
+            response_done.set()
+
+    await application(scope, receive, send)
+    return messages[0]['status']
+
+
+class Command(BaseCommand):
+    help = 'Compares license validation throughput of the WSGI (sync) and ASGI (async) applications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Number of requests per run')
+        parser.add_argument('--concurrency', type=int, default=50, help='Concurrent requests in flight')
+        parser.add_argument('--cold', action='store_true', help='Clear the lookup cache before every request')
+
+    def handle(self, *args, **options):
+        numbers = list(License.objects.values_list('license_number', flat=True)[:1000])
+        if not numbers:
+            raise CommandError("No license in the database to benchmark against.")
+
+        total = options['requests']
+        concurrency = options['concurrency']
+        cold = options['cold']
+        numbers = [numbers[i % len(numbers)] for i in range(total)]
+
+        from license_manager.asgi import application as asgi_application
+        from license_manager.wsgi import application as wsgi_application
+
+        def wsgi_call(number):
+            if cold:
+                license_cache.clear()
+            return _wsgi_get(wsgi_application, f'/api/licenses/{number}/')
+
+        license_cache.clear()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(wsgi_call, numbers))
+        self._report("WSGI (sync view, thread pool)", total, time.perf_counter() - start)
+
+        async def asgi_run():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def call(number):
+                async with semaphore:
+                    if cold:
+                        license_cache.clear()
+                    return await _asgi_get(asgi_application, f'/api/async/licenses/{number}/')
+
+            await asyncio.gather(*(call(number) for number in numbers))
+
+        license_cache.clear()
+        start = time.perf_counter()
+        asyncio.run(asgi_run())
+        self._report("ASGI (async view, single event loop)", total, time.perf_counter() - start)
+
+    def _report(self, label, total, elapsed):
+        self.stdout.write(
+            f"{label}: {total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s)"
+        )
@@ -1,90 +1,241 @@
+import time
+
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from django.core.mail import send_mail
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, send_mail
 from django.conf import settings
-from license_app.models import License
+from django.db import connection
+from django.db.models import Case, Exists, IntegerField, OuterRef, Value, When
+from license_app.mailing import deliver_messages
+from license_app.models import ExpirationAlert, License
 from datetime import timedelta
 
+
+class QueryCounter:
+    """Counts the SQL queries executed on a connection (see connection.execute_wrapper)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
 class Command(BaseCommand):
     help = 'Checks for expiring licenses and sends alerts'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=getattr(settings, 'LICENSE_ALERT_BATCH_SIZE', 100),
+            help='Number of alert emails sent per mail backend connection',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=getattr(settings, 'LICENSE_ALERT_CONCURRENCY', 1),
+            help='Number of batches delivered in parallel',
+        )
+        parser.add_argument(
+            '--rate-limit', type=float, default=getattr(settings, 'LICENSE_ALERT_RATE_LIMIT', None),
+            help='Maximum number of alert emails per second',
+        )
+        parser.add_argument(
+            '--digest', action='store_true',
+            help='Send one email per customer listing all its expiring licenses',
+        )
+        parser.add_argument(
+            '--include-users', action='store_true',
+            help='With --digest, also send the digest to the users associated with the customer',
+        )
+        parser.add_argument(
+            '--resend', action='store_true',
+            help='Alert every license in the window, even those already alerted for their threshold',
+        )
+
     def handle(self, *args, **options):
-        today = timezone.now().date()
-        expiring_threshold = today + timedelta(days=30)
+        self.delivery_options = {
+            'batch_size': options['batch_size'],
+            'concurrency': options['concurrency'],
+            'rate_limit': options['rate_limit'],
+        }
+        self.digest = options['digest']
+        self.include_users = options['include_users']
+        self.thresholds = sorted(getattr(settings, 'LICENSE_ALERT_THRESHOLDS', [30, 7, 1]))
+        self.window = self.thresholds[-1]
+        started = time.perf_counter()
+        queries = QueryCounter()
+
+        with connection.execute_wrapper(queries):
+            today = timezone.now().date()
+            expiring_licenses = self.expiring_queryset(today, options['resend'])
+            # Each set is loaded exactly once, with customer and product joined
+            expiring_licenses = list(expiring_licenses.select_related('customer', 'product').order_by('expiry_date'))
+            expired_licenses = list(
+                License.objects.filter(
+                    status='active',
+                    expiry_date__lt=today
+                ).select_related('customer').order_by('expiry_date')
+            )
+            loaded = time.perf_counter()
+
+            self.stdout.write(self.style.NOTICE("Checking for expiring licenses..."))
+
+            if expiring_licenses:
+                self.report_expiring(expiring_licenses, today)
+            else:
+                self.stdout.write(self.style.SUCCESS(f"✅ No new license expiring within the next {self.window} days."))
+
+            if expired_licenses:
+                self.stdout.write(self.style.ERROR(f"\n🔴 FOUND {len(expired_licenses)} EXPIRED BUT ACTIVE LICENSE(S):"))
+                for license in expired_licenses:
+                    self.stdout.write(f" - [{license.license_number}] {license.customer} (Expired on {license.expiry_date})")
+
+        finished = time.perf_counter()
+        self.stdout.write(
+            f"\nDone in {finished - started:.2f}s "
+            f"(load {loaded - started:.2f}s, alerts {finished - loaded:.2f}s), {queries.count} queries."
+        )
 
-        # Check for expiring licenses (active and expiry_date within 30 days)
-        expiring_licenses = License.objects.filter(
+    def expiring_queryset(self, today, resend=False):
+        """
+        Active licenses within the alert window, annotated with the smallest
+        threshold they are under. Unless ``resend`` is set, licenses already
+        alerted for that threshold (and expiry date) are excluded by an
+        anti-join on the ledger, so the work scales with the new alerts only.
+        """
+        tier = Case(
+            *[When(expiry_date__lte=today + timedelta(days=t), then=Value(t)) for t in self.thresholds],
+            output_field=IntegerField(),
+        )
+        licenses = License.objects.filter(
             status='active',
-            expiry_date__lte=expiring_threshold,
+            expiry_date__lte=today + timedelta(days=self.window),
             expiry_date__gte=today
-        )
+        ).annotate(alert_threshold=tier)
+        if not resend:
+            licenses = licenses.filter(~Exists(ExpirationAlert.objects.filter(
+                license=OuterRef('pk'),
+                threshold=OuterRef('alert_threshold'),
+                expiry_date=OuterRef('expiry_date'),
+            )))
+        return licenses
 
-        self.stdout.write(self.style.NOTICE(f"Checking for expiring licenses..."))
-
-        alerts_sent = 0
-
-        if expiring_licenses.exists():
-            self.stdout.write(self.style.WARNING(f"⚠️ FOUND {expiring_licenses.count()} EXPIRING LICENSE(S):"))
-
-            # Group by customer or send individually. Let's send individually for simplicity and direct alerting.
-            for license in expiring_licenses:
-                days_left = (license.expiry_date - today).days
-                message = f" - [{license.license_number}] {license.customer} (Expires in {days_left} days on {license.expiry_date})"
-                self.stdout.write(message)
-
-                # Send email to Customer if email exists
-                if license.customer.email:
-                    subject = f"Avis d'expiration de licence: {license.product.name}"
-                    body = (
-                        f"Bonjour {license.customer.name},\n\n"
-                        f"Votre licence pour le produit '{license.product.name}' (Numéro: {license.license_number}) "
-                        f"expire dans {days_left} jours (le {license.expiry_date}).\n\n"
-                        f"Merci de nous contacter pour le renouvellement.\n\n"
-                        f"Cordialement,\nL'équipe License Manager"
-                    )
-                    try:
-                        send_mail(
-                            subject,
-                            body,
-                            settings.DEFAULT_FROM_EMAIL,
-                            [license.customer.email],
-                            fail_silently=False,
-                        )
-                        self.stdout.write(self.style.SUCCESS(f"   -> Email sent to {license.customer.email}"))
-                        alerts_sent += 1
-                    except Exception as e:
-                        self.stdout.write(self.style.ERROR(f"   -> Failed to send email to {license.customer.email}: {e}"))
-
-            # Send summary to Admin
-            admin_emails = [admin[1] for admin in getattr(settings, 'ADMINS', [])]
-            # If ADMINS not configured, assume a default for the sake of the exercise or just skip
-            if not admin_emails:
-                admin_emails = ['admin@licensemanager.local'] # Fallback
-
-            summary_subject = f"[License Manager] {expiring_licenses.count()} licences expirent bientôt"
-            summary_body = "Les licences suivantes expirent dans les 30 jours :\n\n"
-            for license in expiring_licenses:
-                summary_body += f"- {license.customer.name} / {license.product.name} ({license.license_number}) : Expire le {license.expiry_date}\n"
-
-            send_mail(
-                summary_subject,
-                summary_body,
-                settings.DEFAULT_FROM_EMAIL,
-                admin_emails,
-                fail_silently=True
+    def report_expiring(self, expiring_licenses, today):
+        self.stdout.write(self.style.WARNING(f"⚠️ FOUND {len(expiring_licenses)} EXPIRING LICENSE(S):"))
+
+        summary_lines = []
+        alerts = []
+        self.alerted = {}  # message -> licenses it covers
+        for license in expiring_licenses:
+            days_left = (license.expiry_date - today).days
+            product_name = license.product.name if license.product else "-"
+            self.stdout.write(f" - [{license.license_number}] {license.customer} (Expires in {days_left} days on {license.expiry_date})")
+            summary_lines.append(
+                f"- {license.customer.name} / {product_name} ({license.license_number}) : Expire le {license.expiry_date}\n"
             )
-            self.stdout.write(self.style.SUCCESS(f"-> Summary email sent to admins: {', '.join(admin_emails)}"))
 
-        else:
-            self.stdout.write(self.style.SUCCESS("✅ No licenses expiring within the next 30 days."))
+            # Send email to Customer if email exists
+            if not self.digest and license.customer.email:
+                alerts.append(self.customer_alert(license, product_name, days_left))
 
-        # Check for already expired active licenses
-        expired_licenses = License.objects.filter(
-            status='active',
-            expiry_date__lt=today
+        if self.digest:
+            alerts = self.customer_digests(expiring_licenses, today)
+
+        failed = set()
+        if alerts:
+            failed = self.deliver_alerts(alerts)
+        self.record_alerts(expiring_licenses, failed)
+
+        # Send summary to Admin
+        admin_emails = [admin[1] for admin in getattr(settings, 'ADMINS', [])]
+        # If ADMINS not configured, assume a default for the sake of the exercise or just skip
+        if not admin_emails:
+            admin_emails = ['admin@licensemanager.local'] # Fallback
+
+        summary_subject = f"[License Manager] {len(expiring_licenses)} licences expirent bientôt"
+        summary_body = f"Les licences suivantes expirent dans les {self.window} jours :\n\n" + "".join(summary_lines)
+
+        send_mail(
+            summary_subject,
+            summary_body,
+            settings.DEFAULT_FROM_EMAIL,
+            admin_emails,
+            fail_silently=True
         )
+        self.stdout.write(self.style.SUCCESS(f"-> Summary email sent to admins: {', '.join(admin_emails)}"))
 
-        if expired_licenses.exists():
-            self.stdout.write(self.style.ERROR(f"\n🔴 FOUND {expired_licenses.count()} EXPIRED BUT ACTIVE LICENSE(S):"))
-            for license in expired_licenses:
-                self.stdout.write(f" - [{license.license_number}] {license.customer} (Expired on {license.expiry_date})")
+    def customer_alert(self, license, product_name, days_left):
+        subject = f"Avis d'expiration de licence: {product_name}"
+        body = (
+            f"Bonjour {license.customer.name},\n\n"
+            f"Votre licence pour le produit '{product_name}' (Numéro: {license.license_number}) "
+            f"expire dans {days_left} jours (le {license.expiry_date}).\n\n"
+            f"Merci de nous contacter pour le renouvellement.\n\n"
+            f"Cordialement,\nL'équipe License Manager"
+        )
+        message = EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [license.customer.email])
+        self.alerted[message] = [license]
+        return message
+
+    def customer_digests(self, expiring_licenses, today):
+        """Build one email per customer listing all of its expiring licenses."""
+        by_customer = {}
+        for license in expiring_licenses:
+            by_customer.setdefault(license.customer_id, []).append(license)
+
+        user_emails = {}
+        if self.include_users:
+            # One query for the users of every customer concerned
+            for customer_id, email in User.objects.filter(
+                customers__in=by_customer, is_active=True
+            ).exclude(email='').values_list('customers', 'email'):
+                user_emails.setdefault(customer_id, []).append(email)
+
+        digests = []
+        for customer_id, licenses in by_customer.items():
+            customer = licenses[0].customer
+            recipients = list(dict.fromkeys(
+                ([customer.email] if customer.email else []) + user_emails.get(customer_id, [])
+            ))
+            if not recipients:
+                continue
+
+            lines = "".join(
+                f"- {license.product.name if license.product else '-'} (Numéro: {license.license_number}) : "
+                f"expire dans {(license.expiry_date - today).days} jours (le {license.expiry_date})\n"
+                for license in licenses
+            )
+            subject = f"Avis d'expiration: {len(licenses)} licence(s) expirent bientôt"
+            body = (
+                f"Bonjour {customer.name},\n\n"
+                f"Les licences suivantes expirent dans les {self.window} jours :\n\n"
+                f"{lines}\n"
+                f"Merci de nous contacter pour le renouvellement.\n\n"
+                f"Cordialement,\nL'équipe License Manager"
+            )
+            message = EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, recipients)
+            self.alerted[message] = licenses
+            digests.append(message)
+        return digests
+
+    def deliver_alerts(self, alerts):
+        report = deliver_messages(alerts, **self.delivery_options)
+        self.stdout.write(self.style.SUCCESS(f"   -> {report.sent} alert email(s) sent"))
+        for message, e in report.failed:
+            self.stdout.write(self.style.ERROR(f"   -> Failed to send email to {', '.join(message.to)}: {e}"))
+        return {license.pk for message, e in report.failed for license in self.alerted[message]}
+
+    def record_alerts(self, expiring_licenses, failed):
+        """Write the ledger rows, leaving out licenses whose alert could not be sent."""
+        ExpirationAlert.objects.bulk_create(
+            [
+                ExpirationAlert(
+                    license=license,
+                    threshold=license.alert_threshold,
+                    expiry_date=license.expiry_date,
+                )
+                for license in expiring_licenses
+                if license.pk not in failed
+            ],
+            ignore_conflicts=True,
+        )
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from license_app.bulk import expire_overdue_licenses
+
+
+class Command(BaseCommand):
+    help = 'Marks active licenses past their expiry date as expired, with history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=getattr(settings, 'LICENSE_BULK_CHUNK_SIZE', 1000),
+            help='Number of licenses updated per transaction',
+        )
+
+    def handle(self, *args, **options):
+        expired = expire_overdue_licenses(chunk_size=options['chunk_size'])
+        if expired:
+            self.stdout.write(self.style.WARNING(f"🔴 {expired} licence(s) marked as expired."))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ No overdue active license."))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from license_app.import_pipeline import ImportAborted, stream_import, validate_file
+
+
+class Command(BaseCommand):
+    help = 'Imports licenses from a CSV or XLSX file, chunk by chunk with a resumable checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file to import')
+        parser.add_argument('--chunk-size', type=int, help='Number of rows committed per transaction')
+        parser.add_argument('--resume', action='store_true', help='Restart after the last committed chunk of a failed import')
+        parser.add_argument('--validate-only', action='store_true', help='Report every error in the file without importing it')
+
+    def handle(self, *args, **options):
+        if options['validate_only']:
+            return self.validate(options['path'], options['chunk_size'])
+
+        def progress(done, totals):
+            self.stdout.write(f"   {done} rows committed")
+
+        try:
+            totals = stream_import(
+                options['path'],
+                chunk_size=options['chunk_size'],
+                resume=options['resume'],
+                on_chunk=progress,
+            )
+        except ImportAborted as e:
+            raise CommandError(
+                f"Import stopped after {e.rows_committed} committed rows; fix the file and rerun with --resume.\n{e}"
+            )
+
+        summary = ", ".join(f"{value} {key}" for key, value in totals.items() if value)
+        self.stdout.write(self.style.SUCCESS(f"✅ Import done: {summary or 'nothing to import'}."))
+
+    def validate(self, path, chunk_size):
+        try:
+            errors = validate_file(path, chunk_size=chunk_size)
+        except ImportAborted as e:
+            raise CommandError(str(e))
+        for error in errors:
+            self.stdout.write(self.style.ERROR(str(error)))
+        if errors:
+            raise CommandError(f"{len(errors)} error(s) found.")
+        self.stdout.write(self.style.SUCCESS("✅ No error found."))
@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from django.utils import timezone
+from license_app.models import License, LicenseToken
+from license_app.tokens import make_license_token, token_max_age
+
+
+class Command(BaseCommand):
+    help = 'Issues signed offline tokens for licenses whose token is missing or outdated'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-issue tokens for every license')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of tokens written per query')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        licenses = License.objects.all()
+        now = timezone.now()
+        if not options['all']:
+            # Licenses changed since their last token (extend_validity, change_status, ...)
+            outdated = Q(token__isnull=True) | Q(token__issued_at__lt=F('updated_at'))
+            max_age = token_max_age()
+            if max_age is not None:
+                # and tokens past half their lifetime, renewed before clients reject them
+                outdated |= Q(token__issued_at__lt=now - timedelta(seconds=max_age / 2))
+            licenses = licenses.filter(outdated)
+
+        issued = 0
+        last_pk = 0
+        while True:
+            # Keyset pagination keeps each read short and independent of the writes
+            rows = list(licenses.filter(pk__gt=last_pk).order_by('pk').values_list(
+                'pk', 'license_number', 'product__name', 'expiry_date', 'status'
+            )[:batch_size])
+            if not rows:
+                break
+            LicenseToken.objects.bulk_create(
+                [
+                    LicenseToken(
+                        license_id=pk,
+                        token=make_license_token(number, product, expiry_date, status),
+                        issued_at=now,
+                    )
+                    for pk, number, product, expiry_date, status in rows
+                ],
+                update_conflicts=True,
+                unique_fields=['license'],
+                update_fields=['token', 'issued_at'],
+            )
+            issued += len(rows)
+            last_pk = rows[-1][0]
+
+        self.stdout.write(self.style.SUCCESS(f"✅ {issued} token(s) issued."))
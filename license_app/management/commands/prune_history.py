@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from license_app.retention import Archive, archive_path, history_models, prunable, prune_history
+
+
+class Command(BaseCommand):
+    help = 'Deletes (and archives) history records older than the retention period, keeping the latest one per object'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'LICENSE_HISTORY_RETENTION_DAYS', 365),
+            help='Keep history records of the last N days',
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of records deleted per transaction')
+        parser.add_argument(
+            '--pause', type=float, default=0.05,
+            help='Seconds to wait between batches, leaving the write lock to other connections',
+        )
+        parser.add_argument('--archive-dir', help='Directory of the archive files (default: LICENSE_HISTORY_ARCHIVE_ROOT)')
+        parser.add_argument('--no-archive', action='store_true', help='Delete without writing archive files')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the records that would be deleted')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        self.stdout.write(f"Pruning history recorded before {cutoff:%Y-%m-%d %H:%M}...")
+
+        for history_model in history_models():
+            name = history_model._meta.verbose_name_plural
+            if options['dry_run']:
+                count = prunable(history_model, cutoff).count()
+                self.stdout.write(f" - {name}: {count} record(s) would be deleted")
+                continue
+
+            archive = None if options['no_archive'] else Archive(archive_path(history_model, options['archive_dir']))
+            try:
+                deleted = prune_history(
+                    history_model, cutoff,
+                    batch_size=options['batch_size'], archive=archive, pause=options['pause'],
+                )
+            finally:
+                if archive is not None:
+                    archive.close()
+
+            if deleted and archive is not None:
+                self.stdout.write(self.style.SUCCESS(f" - {name}: {deleted} record(s) deleted, archived to {archive.path}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f" - {name}: {deleted} record(s) deleted"))
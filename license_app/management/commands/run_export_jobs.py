@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from license_app.exports import run_export_job
+from license_app.jobs import claim_next
+from license_app.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = 'Processes pending license export jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the pending jobs, then exit')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls when idle')
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next(ExportJob)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+                continue
+
+            self.stdout.write(f"Running {job}...")
+            if run_export_job(job):
+                self.stdout.write(self.style.SUCCESS(f"✅ {job} done."))
+            else:
+                job.refresh_from_db()
+                self.stdout.write(self.style.ERROR(f"❌ {job} failed: {job.error}"))
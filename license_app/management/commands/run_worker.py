@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from license_app.exports import run_export_job
+from license_app.jobs import claim_next, run_bulk_job
+from license_app.models import BulkJob, ExportJob
+
+
+class Command(BaseCommand):
+    help = 'Processes queued admin bulk jobs and license export jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the pending jobs, then exit')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls when idle')
+
+    def handle(self, *args, **options):
+        # Bulk jobs first: an admin is usually waiting for their result
+        queues = [(BulkJob, run_bulk_job), (ExportJob, run_export_job)]
+        while True:
+            for model, run in queues:
+                job = claim_next(model)
+                if job is not None:
+                    break
+            else:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+                continue
+
+            self.stdout.write(f"Running {job}...")
+            if run(job):
+                self.stdout.write(self.style.SUCCESS(f"✅ {job} done."))
+            else:
+                job.refresh_from_db()
+                self.stdout.write(self.style.ERROR(f"❌ {job} failed: {job.error}"))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("license_app", "0004_historicalcustomer_historicallicense"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LicenseToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.TextField(verbose_name="Jeton signé")),
+                ("issued_at", models.DateTimeField(verbose_name="Date d'émission")),
+                (
+                    "license",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="token",
+                        to="license_app.license",
+                        verbose_name="Licence",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Jeton de licence",
+                "verbose_name_plural": "Jetons de licence",
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("license_app", "0005_licensetoken"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="license",
+            index=models.Index(
+                fields=["status", "expiry_date"], name="license_status_expiry_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="license",
+            index=models.Index(
+                fields=["customer", "expiry_date"], name="license_customer_expiry_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="license",
+            index=models.Index(
+                fields=["product", "status", "expiry_date"],
+                name="license_product_status_idx",
+            ),
+        ),
+    ]
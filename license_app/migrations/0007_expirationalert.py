@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("license_app", "0006_license_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExpirationAlert",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "threshold",
+                    models.PositiveIntegerField(verbose_name="Seuil (jours)"),
+                ),
+                (
+                    "expiry_date",
+                    models.DateField(verbose_name="Date d'expiration alertée"),
+                ),
+                (
+                    "sent_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Date d'envoi"
+                    ),
+                ),
+                (
+                    "license",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="expiration_alerts",
+                        to="license_app.license",
+                        verbose_name="Licence",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Alerte d'expiration",
+                "verbose_name_plural": "Alertes d'expiration",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("license", "threshold", "expiry_date"),
+                        name="unique_expiration_alert",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("license_app", "0008_exportjob"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BulkJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("set_product", "Modification du produit"),
+                            ("bulk_update_dates", "Gestion des dates"),
+                            ("bulk_change_status", "Changement de statut"),
+                        ],
+                        max_length=30,
+                        verbose_name="Action",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "En attente"),
+                            ("running", "En cours"),
+                            ("done", "Terminé"),
+                            ("failed", "Échec"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                        verbose_name="Statut",
+                    ),
+                ),
+                ("params", models.JSONField(default=dict, verbose_name="Paramètres")),
+                ("query", models.BinaryField(verbose_name="Requête")),
+                (
+                    "total",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Nombre de licences"
+                    ),
+                ),
+                (
+                    "processed",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Licences traitées"
+                    ),
+                ),
+                ("result", models.TextField(blank=True, verbose_name="Résultat")),
+                ("error", models.TextField(blank=True, verbose_name="Erreur")),
+                (
+                    "notified",
+                    models.BooleanField(default=False, verbose_name="Résultat affiché"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Date de création"
+                    ),
+                ),
+                (
+                    "started_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Début"),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Fin"),
+                ),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Demandé par",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Traitement en masse",
+                "verbose_name_plural": "Traitements en masse",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
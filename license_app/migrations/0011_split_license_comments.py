@@ -0,0 +1,91 @@
+import re
+from datetime import datetime, timezone
+
+from django.db import migrations
+
+# Lines appended by the former License.change_status(): "\n[YYYY-mm-dd HH:MM] message"
+EVENT_LINE = re.compile(r"\n\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2})\] ")
+BATCH_SIZE = 500
+
+
+def split_comment(comment):
+    """Return the free text preceding the first event line, and the (timestamp, message) pairs."""
+    parts = EVENT_LINE.split(comment)
+    events = [
+        (
+            datetime.strptime(stamp, "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc),
+            message,
+        )
+        for stamp, message in zip(parts[1::2], parts[2::2])
+    ]
+    return parts[0], events
+
+
+def comments_to_events(apps, schema_editor):
+    License = apps.get_model("license_app", "License")
+    LicenseEvent = apps.get_model("license_app", "LicenseEvent")
+
+    # Walked by primary key rather than with iterator(): the table is updated as it is read
+    licenses = (
+        License.objects.filter(comment__contains="\n[")
+        .only("pk", "comment")
+        .order_by("pk")
+    )
+    last_pk = 0
+    while True:
+        batch = list(licenses.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+
+        events, changed = [], []
+        for license in batch:
+            text, found = split_comment(license.comment)
+            if not found:
+                continue
+            events.extend(
+                LicenseEvent(
+                    license_id=license.pk, created_at=created_at, message=message
+                )
+                for created_at, message in found
+            )
+            license.comment = text or None
+            changed.append(license)
+
+        LicenseEvent.objects.bulk_create(events, batch_size=BATCH_SIZE)
+        License.objects.bulk_update(changed, ["comment"], batch_size=BATCH_SIZE)
+
+
+def events_to_comments(apps, schema_editor):
+    License = apps.get_model("license_app", "License")
+    LicenseEvent = apps.get_model("license_app", "LicenseEvent")
+
+    lines = {}
+    for license_id, created_at, message in (
+        LicenseEvent.objects.exclude(message="")
+        .order_by("license_id", "created_at", "id")
+        .values_list("license_id", "created_at", "message")
+        .iterator(chunk_size=BATCH_SIZE)
+    ):
+        stamp = created_at.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M")
+        lines.setdefault(license_id, []).append(f"\n[{stamp}] {message}")
+
+    pks = list(lines)
+    for i in range(0, len(pks), BATCH_SIZE):
+        licenses = list(
+            License.objects.filter(pk__in=pks[i : i + BATCH_SIZE]).only("pk", "comment")
+        )
+        for license in licenses:
+            license.comment = (license.comment or "") + "".join(lines[license.pk])
+        License.objects.bulk_update(licenses, ["comment"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("license_app", "0010_licenseevent"),
+    ]
+
+    operations = [
+        migrations.RunPython(comments_to_events, events_to_comments),
+    ]
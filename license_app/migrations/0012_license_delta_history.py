@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("license_app", "0011_split_license_comments"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="historicallicense",
+            name="history_delta",
+            field=models.JSONField(
+                blank=True, null=True, verbose_name="Champs modifiés"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicallicense",
+            name="created_at",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="Date de création"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicallicense",
+            name="license_number",
+            field=models.CharField(
+                db_index=True,
+                max_length=64,
+                null=True,
+                verbose_name="Numéro de licence",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicallicense",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("active", "Active"),
+                    ("expired", "Expirée"),
+                    ("suspended", "Suspendue"),
+                    ("pending", "En attente"),
+                ],
+                default="active",
+                max_length=20,
+                null=True,
+                verbose_name="Statut",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicallicense",
+            name="updated_at",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="Dernière modification",
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def create_search_indexes(apps, schema_editor):
+    # Vendor-specific indexes (NOCASE / text_pattern_ops prefixes, FTS5 / GIN on
+    # comments) that Meta.indexes cannot express portably; see license_app.search.
+    from license_app.search import install_search_indexes
+
+    install_search_indexes(schema_editor.connection)
+
+
+def drop_search_indexes(apps, schema_editor):
+    from license_app.search import uninstall_search_indexes
+
+    uninstall_search_indexes(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("license_app", "0012_license_delta_history"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fail_queued_exports(apps, schema_editor):
+    # Their pickled query is not loaded again: they have to be queued anew
+    ExportJob = apps.get_model("license_app", "ExportJob")
+    ExportJob.objects.filter(status__in=["pending", "running"]).update(
+        status="failed",
+        error="Export à relancer : il a été programmé avant la mise à jour.",
+        finished_at=timezone.now(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("license_app", "0013_license_search_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_queued_exports, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="exportjob",
+            name="query",
+        ),
+        migrations.AddField(
+            model_name="exportjob",
+            name="selection",
+            field=models.JSONField(default=dict, verbose_name="Sélection"),
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fail_queued_bulk_jobs(apps, schema_editor):
+    # Their pickled query is not loaded again: the action has to be run anew
+    BulkJob = apps.get_model("license_app", "BulkJob")
+    BulkJob.objects.filter(status__in=["pending", "running"]).update(
+        status="failed",
+        error="Traitement à relancer : il a été programmé avant la mise à jour.",
+        finished_at=timezone.now(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("license_app", "0014_exportjob_selection"),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_queued_bulk_jobs, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="bulkjob",
+            name="query",
+        ),
+        migrations.AddField(
+            model_name="bulkjob",
+            name="selection",
+            field=models.JSONField(default=dict, verbose_name="Sélection"),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("license_app", "0015_bulkjob_selection"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bulkjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Dernière progression"
+            ),
+        ),
+        migrations.AddField(
+            model_name="exportjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Dernière progression"
+            ),
+        ),
+    ]
@@ -5,6 +5,8 @@ from django.contrib.auth.models import User
 from datetime import timedelta
 from simple_history.models import HistoricalRecords
 
+from .history import DeltaHistoricalRecords, hydrate
+
 class ClientType(models.Model):
     name = models.CharField(max_length=50, unique=True, verbose_name="Type de client")
 
@@ -43,6 +45,31 @@ class Product(models.Model):
         verbose_name_plural = "Produits"
 
 
+class LicenseQuerySet(models.QuerySet):
+    def with_expiry(self, today=None):
+        """
+        Annote ``expiry_delta`` (durée restante avant expiration) et
+        ``expiry_tier`` (tranche d'expiration, voir License.EXPIRY_TIERS)
+        calculés en SQL, une seule fois pour toute la requête.
+        """
+        today = today or timezone.now().date()
+        return self.annotate(
+            expiry_delta=models.ExpressionWrapper(
+                models.F('expiry_date') - models.Value(today), output_field=models.DurationField()
+            ),
+            expiry_tier=models.Case(
+                models.When(expiry_date__isnull=True, then=models.Value('none')),
+                models.When(expiry_date__lt=today, then=models.Value('expired')),
+                *[
+                    models.When(expiry_date__lte=today + timedelta(days=days), then=models.Value(tier))
+                    for tier, days in License.EXPIRY_TIER_DAYS
+                ],
+                default=models.Value('ok'),
+                output_field=models.CharField(),
+            ),
+        )
+
+
 class License(models.Model):
     STATUS = [
         ("active", "Active"),
@@ -60,15 +87,39 @@ class License(models.Model):
     comment = models.TextField(blank=True, null=True, verbose_name="Commentaire")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Dernière modification")
-    history = HistoricalRecords()
+    history = DeltaHistoricalRecords()
+
+    objects = LicenseQuerySet.as_manager()
+
+    # Tranches d'expiration : (tranche, jours restants maximum), de la plus proche à la plus lointaine
+    EXPIRY_TIER_DAYS = [('soon', 30), ('later', 90)]
+    EXPIRY_TIERS = {
+        'none': "⚪ Non défini",
+        'expired': "🔴 Expirée",
+        'soon': "🟠 Expire dans {days} jours",
+        'later': "🟡 Expire dans {days} jours",
+        'ok': "🟢 Expire dans {days} jours",
+    }
 
     class Meta:
         verbose_name = "Licence"
         verbose_name_plural = "Licences"
         ordering = ['-expiry_date']
+        indexes = [
+            models.Index(fields=['status', 'expiry_date'], name='license_status_expiry_idx'),
+            models.Index(fields=['customer', 'expiry_date'], name='license_customer_expiry_idx'),
+            models.Index(fields=['product', 'status', 'expiry_date'], name='license_product_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.license_number} - {self.customer}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Values as loaded, compared on save to write delta-only history (see history.compact_record)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
     
     def clean(self):
         """Validation personnalisée"""
@@ -99,14 +150,17 @@ class License(models.Model):
         if save:
             self.save()
 
-    def change_status(self, status, comment=None, save=True):
-        """Change le statut de la licence et ajoute un commentaire"""
+    def change_status(self, status, comment=None, save=True, author=None):
+        """
+        Change le statut de la licence et journalise le changement dans
+        LicenseEvent. Sans ``save``, l'événement est renvoyé non enregistré.
+        """
         self.status = status
-        if comment:
-            timestamp = timezone.now().strftime('%Y-%m-%d %H:%M')
-            self.comment = (self.comment or '') + f"\n[{timestamp}] {comment}"
+        event = LicenseEvent(license=self, status=status, author=author, message=comment or '')
         if save:
             self.save()
+            event.save()
+        return event
 
     def activate(self, save=True):
         """Active la licence"""
@@ -120,6 +174,25 @@ class License(models.Model):
         """Auto-update du statut basé sur la date d'expiration"""
         self._update_status_from_expiry()
         super().save(*args, **kwargs)
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname not in deferred
+        }
+
+    def history_version(self, at=None):
+        """
+        Version historique complète de la licence à la date ``at`` (la plus
+        récente par défaut), reconstruite si elle est stockée en delta.
+        """
+        records = self.history.all()
+        if at is not None:
+            records = records.filter(history_date__lte=at)
+        record = records.first()
+        if record is not None:
+            hydrate([record])
+        return record
     
     def is_expired(self):
         if self.expiry_date:
@@ -130,23 +203,172 @@ class License(models.Model):
     
     def days_until_expiry(self):
         """Calcule le nombre de jours avant expiration"""
+        if hasattr(self, 'expiry_delta'):
+            # Annoté par License.objects.with_expiry()
+            return self.expiry_delta.days if self.expiry_delta is not None else None
         if self.expiry_date:
             delta = self.expiry_date - timezone.now().date()
             return delta.days
         return None
-    
-    def expiry_status(self):
-        """Retourne un indicateur visuel du statut d'expiration"""
+
+    def get_expiry_tier(self):
+        """Tranche d'expiration (clé de EXPIRY_TIERS)"""
+        if hasattr(self, 'expiry_tier'):
+            return self.expiry_tier
         days = self.days_until_expiry()
         if days is None:
-            return "⚪ Non défini"
-        elif days < 0:
-            return "🔴 Expirée"
-        elif days <= 30:
-            return f"🟠 Expire dans {days} jours"
-        elif days <= 90:
-            return f"🟡 Expire dans {days} jours"
-        else:
-            return f"🟢 Expire dans {days} jours"
+            return 'none'
+        if days < 0:
+            return 'expired'
+        for tier, max_days in self.EXPIRY_TIER_DAYS:
+            if days <= max_days:
+                return tier
+        return 'ok'
+
+    def expiry_status(self):
+        """Retourne un indicateur visuel du statut d'expiration"""
+        return self.EXPIRY_TIERS[self.get_expiry_tier()].format(days=self.days_until_expiry())
     
     expiry_status.short_description = "État d'expiration"
+
+
+class LicenseEvent(models.Model):
+    """Journal des changements de statut d'une licence, en ajout seul."""
+
+    license = models.ForeignKey(License, on_delete=models.CASCADE, related_name='events', verbose_name="Licence")
+    status = models.CharField(max_length=20, choices=License.STATUS, blank=True, verbose_name="Statut")
+    author = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Auteur")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Date")
+    message = models.TextField(blank=True, verbose_name="Message")
+
+    class Meta:
+        verbose_name = "Événement de licence"
+        verbose_name_plural = "Événements de licence"
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['license', '-created_at'], name='license_event_license_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.license.license_number} - {self.created_at:%Y-%m-%d %H:%M}"
+
+
+class LicenseToken(models.Model):
+    license = models.OneToOneField(License, on_delete=models.CASCADE, related_name='token', verbose_name="Licence")
+    token = models.TextField(verbose_name="Jeton signé")
+    issued_at = models.DateTimeField(verbose_name="Date d'émission")
+
+    def __str__(self):
+        return f"Jeton {self.license_id} ({self.issued_at:%Y-%m-%d %H:%M})"
+
+    class Meta:
+        verbose_name = "Jeton de licence"
+        verbose_name_plural = "Jetons de licence"
+
+
+class ExpirationAlert(models.Model):
+    """Registre des alertes d'expiration déjà envoyées, une ligne par seuil franchi."""
+    license = models.ForeignKey(License, on_delete=models.CASCADE, related_name='expiration_alerts', verbose_name="Licence")
+    threshold = models.PositiveIntegerField(verbose_name="Seuil (jours)")
+    expiry_date = models.DateField(verbose_name="Date d'expiration alertée")
+    sent_at = models.DateTimeField(auto_now_add=True, verbose_name="Date d'envoi")
+
+    def __str__(self):
+        return f"{self.license_id} - J-{self.threshold}"
+
+    class Meta:
+        verbose_name = "Alerte d'expiration"
+        verbose_name_plural = "Alertes d'expiration"
+        # expiry_date fait partie de la clé pour qu'une licence renouvelée soit de nouveau alertée
+        constraints = [
+            models.UniqueConstraint(fields=['license', 'threshold', 'expiry_date'], name='unique_expiration_alert'),
+        ]
+
+
+class ExportJob(models.Model):
+    FORMATS = [
+        ("csv", "CSV"),
+        ("xlsx", "Excel (XLSX)"),
+        ("parquet", "Parquet"),
+    ]
+    STATUS = [
+        ("pending", "En attente"),
+        ("running", "En cours"),
+        ("done", "Terminé"),
+        ("failed", "Échec"),
+    ]
+
+    format = models.CharField(max_length=10, choices=FORMATS, default='csv', verbose_name="Format")
+    status = models.CharField(max_length=10, choices=STATUS, default='pending', verbose_name="Statut")
+    selection = models.JSONField(default=dict, verbose_name="Sélection")
+    total = models.PositiveIntegerField(default=0, verbose_name="Nombre de licences")
+    processed = models.PositiveIntegerField(default=0, verbose_name="Licences exportées")
+    file_path = models.CharField(max_length=255, blank=True, verbose_name="Fichier")
+    error = models.TextField(blank=True, verbose_name="Erreur")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Demandé par")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Début")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="Dernière progression")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Fin")
+
+    # Error recorded by jobs.fail_stale_jobs() when the worker died
+    STALE_ERROR = "Interrompu : le worker s'est arrêté avant la fin de l'export, relancez-le."
+
+    class Meta:
+        verbose_name = "Export de licences"
+        verbose_name_plural = "Exports de licences"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Export #{self.pk} ({self.get_format_display()})"
+
+    def progress(self):
+        """Pourcentage de licences exportées"""
+        if self.status == 'done':
+            return 100
+        if not self.total:
+            return 0
+        return min(100, self.processed * 100 // self.total)
+
+
+class BulkJob(models.Model):
+    ACTIONS = [
+        ("set_product", "Modification du produit"),
+        ("bulk_update_dates", "Gestion des dates"),
+        ("bulk_change_status", "Changement de statut"),
+    ]
+    STATUS = ExportJob.STATUS
+
+    action = models.CharField(max_length=30, choices=ACTIONS, verbose_name="Action")
+    status = models.CharField(max_length=10, choices=STATUS, default='pending', verbose_name="Statut")
+    params = models.JSONField(default=dict, verbose_name="Paramètres")
+    selection = models.JSONField(default=dict, verbose_name="Sélection")
+    total = models.PositiveIntegerField(default=0, verbose_name="Nombre de licences")
+    processed = models.PositiveIntegerField(default=0, verbose_name="Licences traitées")
+    result = models.TextField(blank=True, verbose_name="Résultat")
+    error = models.TextField(blank=True, verbose_name="Erreur")
+    notified = models.BooleanField(default=False, verbose_name="Résultat affiché")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Demandé par")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Début")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="Dernière progression")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Fin")
+
+    # Error recorded by jobs.fail_stale_jobs() when the worker died
+    STALE_ERROR = "Interrompu : le worker s'est arrêté avant la fin, les lots déjà traités restent appliqués."
+
+    class Meta:
+        verbose_name = "Traitement en masse"
+        verbose_name_plural = "Traitements en masse"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Traitement #{self.pk} ({self.get_action_display()})"
+
+    def progress(self):
+        """Pourcentage de licences traitées"""
+        if self.status == 'done':
+            return 100
+        if not self.total:
+            return 0
+        return min(100, self.processed * 100 // self.total)
@@ -1,10 +1,126 @@
 # license_app/resources.py
 
-from import_export import resources
-from .models import License
+from django.utils import timezone
+from import_export import fields, resources
+
+from .bulk import write_history
+from .cache import license_cache
+from .importing import BulkInstanceLoader, PreloadedForeignKeyWidget
+from .models import Customer, License, Product
+
+IMPORT_REASON = "Import de licences"
+
 
 class LicenseResource(resources.ModelResource):
+    # Foreign keys are resolved from dictionaries loaded once per import
+    customer = fields.Field(
+        attribute='customer', column_name='customer',
+        widget=PreloadedForeignKeyWidget(Customer),
+    )
+    product = fields.Field(
+        attribute='product', column_name='product',
+        widget=PreloadedForeignKeyWidget(Product),
+    )
+
     class Meta:
         model = License
-        fields = ('id', 'license_number', 'customer', 'product', 'start_date', 'expiry_date', 'status', 'comment', 'created_at', 'updated_at')
-        export_order = ('license_number', 'customer', 'product', 'start_date', 'expiry_date', 'status', 'comment', 'created_at', 'updated_at')
+        fields = (
+            'id',
+            'license_number',
+            'customer',
+            'product',
+            'start_date',
+            'expiry_date',
+            'status',
+            'comment',
+            'created_at',
+            'updated_at',
+        )
+        export_order = fields
+        import_id_fields = ['license_number']
+        skip_unchanged = True
+        report_skipped = True
+        # Bulk mode: existing licenses are loaded per chunk and rows are
+        # written with bulk_create / bulk_update instead of one save() each,
+        # their history rows with them (see bulk_create / bulk_update below)
+        use_bulk = True
+        batch_size = 1000
+        # No per-row copy and diff (HTML included) is built or kept in the
+        # result; skip_row() compares with the values the license was loaded with
+        skip_diff = True
+        instance_loader_class = BulkInstanceLoader
+
+    def get_queryset(self):
+        # Joined so that comparing existing rows does not fetch customer and product one by one
+        return super().get_queryset().select_related('customer', 'product')
+
+    def before_import(self, dataset, **kwargs):
+        super().before_import(dataset, **kwargs)
+        # A chunked import keeps the lookups loaded for its first chunk
+        if not kwargs.get('reuse_lookups'):
+            self.fields['customer'].widget.reset()
+            self.fields['product'].widget.reset()
+        self.now = timezone.now()
+        self.user = kwargs.get('user')  # passed by the admin import view
+
+    def skip_row(self, instance, original, row, import_validation_errors=None):
+        # skip_diff leaves no ``original`` to compare with: License.from_db keeps the loaded values
+        loaded = getattr(instance, '_loaded_values', None)
+        if not self._meta.skip_unchanged or import_validation_errors or loaded is None:
+            return False
+        for field in self.get_import_fields():
+            if field.attribute is None:
+                continue
+            attname = License._meta.get_field(field.attribute).attname
+            if attname in loaded and getattr(instance, attname) != loaded[attname]:
+                return False
+        return True
+
+    def before_save_instance(self, instance, row, **kwargs):
+        # bulk_create / bulk_update bypass License.save()
+        instance._update_status_from_expiry()
+        instance.updated_at = self.now
+
+    def bulk_create(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        # Same as ModelResource.bulk_create, plus the '+' history records
+        if self.create_instances and (using_transactions or not dry_run):
+            try:
+                License.objects.bulk_create(self.create_instances, batch_size=batch_size)
+                missing = [obj for obj in self.create_instances if obj.pk is None]
+                if missing:
+                    # Backends that do not return the inserted primary keys
+                    pks = dict(License.objects.filter(
+                        license_number__in=[obj.license_number for obj in missing]
+                    ).values_list('license_number', 'pk'))
+                    for obj in missing:
+                        obj.pk = pks[obj.license_number]
+                write_history(self.create_instances, '+', self.user, IMPORT_REASON, self.now, batch_size)
+            except Exception as e:
+                self.handle_import_error(result, e, raise_errors)
+            finally:
+                self.create_instances.clear()
+
+    def bulk_update(self, using_transactions, dry_run, raise_errors, batch_size=None, result=None):
+        # Same as ModelResource.bulk_update, plus the '~' history records
+        if self.update_instances and (using_transactions or not dry_run):
+            try:
+                License.objects.bulk_update(self.update_instances, self.get_bulk_update_fields(), batch_size=batch_size)
+                write_history(self.update_instances, '~', self.user, IMPORT_REASON, self.now, batch_size)
+            except Exception as e:
+                self.handle_import_error(result, e, raise_errors)
+            finally:
+                self.update_instances.clear()
+
+    def get_bulk_update_fields(self):
+        return [f for f in super().get_bulk_update_fields() if f not in ('id', 'created_at')]
+
+    def after_import(self, dataset, result, **kwargs):
+        super().after_import(dataset, result, **kwargs)
+        license_cache.clear()
+
+
+class LicensePreviewResource(LicenseResource):
+    """LicenseResource of the admin import, whose confirmation page shows the diff of each row."""
+
+    class Meta(LicenseResource.Meta):
+        skip_diff = False
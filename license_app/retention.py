@@ -0,0 +1,115 @@
+import gzip
+import json
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, Min, OuterRef
+from django.utils import timezone
+
+from .history import DeltaHistoryModel, hydrate, tracked_fields
+from .models import Customer, License
+
+
+def history_models():
+    """Historical models covered by the retention policy."""
+    return [License.history.model, Customer.history.model]
+
+
+def prunable(history_model, cutoff):
+    """
+    History rows recorded before ``cutoff`` that are not the latest record of
+    their object: the latest one is always kept, however old, so that every
+    object keeps a last known version (and deleted objects their deletion).
+    """
+    newer = history_model.objects.filter(id=OuterRef('id'), history_id__gt=OuterRef('history_id'))
+    return history_model.objects.filter(history_date__lt=cutoff).filter(Exists(newer))
+
+
+class Archive:
+    """
+    Compressed JSON Lines file the pruned rows are written to before they are
+    deleted. Created on first write, and synced to disk after each batch.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.file = None
+
+    def write(self, rows):
+        if self.file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.raw = open(self.path, 'ab')
+            self.file = gzip.GzipFile(fileobj=self.raw, mode='ab')
+        for row in rows:
+            self.file.write(json.dumps(row, cls=DjangoJSONEncoder).encode() + b'\n')
+        self.file.flush()
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.raw.close()
+
+
+def archive_path(history_model, archive_root=None):
+    archive_root = Path(archive_root or getattr(
+        settings, 'LICENSE_HISTORY_ARCHIVE_ROOT', settings.BASE_DIR / 'history_archive'
+    ))
+    return archive_root / f"{history_model._meta.label_lower}_{timezone.now():%Y%m%d_%H%M%S}.jsonl.gz"
+
+
+def materialize_survivors(history_model, object_ids, cutoff):
+    """
+    Turn the oldest record kept for each of ``object_ids`` into a full
+    record when it is a delta, so that it no longer depends on the older
+    records about to be pruned.
+    """
+    if not issubclass(history_model, DeltaHistoryModel):
+        return
+    pruned = prunable(history_model, cutoff).filter(id__in=object_ids).values('history_id')
+    first_kept = (
+        history_model.objects.filter(id__in=object_ids)
+        .exclude(history_id__in=pruned)
+        .values('id')
+        .annotate(first=Min('history_id'))
+        .values('first')
+    )
+    records = hydrate(list(history_model.objects.filter(history_id__in=first_kept, history_delta__isnull=False)))
+    for record in records:
+        record.history_delta = None
+    history_model.objects.bulk_update(records, [*tracked_fields(history_model), 'history_delta'])
+
+
+def prune_history(history_model, cutoff, batch_size=500, archive=None, pause=0):
+    """
+    Delete the prunable() rows of ``history_model`` ``batch_size`` at a time,
+    in history_id order. Each batch is archived first (when ``archive`` is
+    given), then deleted in its own short transaction, together with the
+    materialization of the delta records it leaves without a base; sleeping ``pause``
+    seconds between batches lets other writers take the SQLite write lock.
+    Returns the number of rows deleted.
+    """
+    candidates = prunable(history_model, cutoff).order_by('history_id')
+    deleted = 0
+    last_id = 0
+
+    while True:
+        rows = list(candidates.filter(history_id__gt=last_id).values()[:batch_size])
+        if not rows:
+            break
+        last_id = rows[-1]['history_id']
+        if archive is not None:
+            archive.write(rows)
+        with transaction.atomic():
+            materialize_survivors(history_model, {row['id'] for row in rows}, cutoff)
+            history_model.objects.filter(history_id__in=[row['history_id'] for row in rows]).delete()
+        deleted += len(rows)
+        if pause:
+            time.sleep(pause)
+
+    return deleted
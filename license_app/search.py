@@ -0,0 +1,143 @@
+"""
+License search backend used by LicenseAdmin.get_search_results().
+
+Each search term matches, by prefix and case-insensitively, the license
+number, the customer name or the product name, or a word of the comment.
+Every branch is served by an index so that the search does not scan the
+license table:
+
+- SQLite: NOCASE indexes, which LIKE 'term%' (istartswith) can use, and an
+  FTS5 table kept in sync with license comments by triggers;
+- PostgreSQL: UPPER(...) text_pattern_ops indexes and a GIN full text index.
+
+These indexes are created by migration 0013 and re-created after every
+migrate (see install_search_indexes), since rebuilding a table on SQLite
+drops the indexes and triggers Django does not know about.
+"""
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.text import smart_split, unescape_string_literal
+
+from .models import Customer, License, Product
+
+
+COMMENT_FTS_TABLE = 'license_comment_fts'
+
+SQLITE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS license_number_search_idx ON license_app_license (license_number COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS customer_name_search_idx ON license_app_customer (name COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS product_name_search_idx ON license_app_product (name COLLATE NOCASE)",
+]
+
+SQLITE_COMMENT_INDEX = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {COMMENT_FTS_TABLE} "
+    f"USING fts5(comment, content='license_app_license', content_rowid='id')",
+    f"CREATE TRIGGER IF NOT EXISTS {COMMENT_FTS_TABLE}_insert AFTER INSERT ON license_app_license BEGIN "
+    f"INSERT INTO {COMMENT_FTS_TABLE}(rowid, comment) VALUES (new.id, new.comment); END",
+    f"CREATE TRIGGER IF NOT EXISTS {COMMENT_FTS_TABLE}_delete AFTER DELETE ON license_app_license BEGIN "
+    f"INSERT INTO {COMMENT_FTS_TABLE}({COMMENT_FTS_TABLE}, rowid, comment) VALUES ('delete', old.id, old.comment); END",
+    f"CREATE TRIGGER IF NOT EXISTS {COMMENT_FTS_TABLE}_update AFTER UPDATE OF comment ON license_app_license BEGIN "
+    f"INSERT INTO {COMMENT_FTS_TABLE}({COMMENT_FTS_TABLE}, rowid, comment) VALUES ('delete', old.id, old.comment); "
+    f"INSERT INTO {COMMENT_FTS_TABLE}(rowid, comment) VALUES (new.id, new.comment); END",
+]
+
+POSTGRESQL_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS license_number_search_idx "
+    "ON license_app_license (UPPER(license_number::text) text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS customer_name_search_idx ON license_app_customer (UPPER(name::text) text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS product_name_search_idx ON license_app_product (UPPER(name::text) text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS license_comment_search_idx "
+    "ON license_app_license USING GIN (to_tsvector('simple', COALESCE(comment, '')))",
+]
+
+
+def _sqlite_names(cursor, kind, prefix):
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = %s AND name LIKE %s", [kind, prefix + '%'])
+    return {name for name, in cursor.fetchall()}
+
+
+def install_search_indexes(connection):
+    """Create the search indexes that are missing; the comment index is rebuilt when its triggers were missing."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for sql in POSTGRESQL_INDEXES:
+                cursor.execute(sql)
+        elif connection.vendor == 'sqlite':
+            for sql in SQLITE_INDEXES:
+                cursor.execute(sql)
+            if len(_sqlite_names(cursor, 'trigger', COMMENT_FTS_TABLE)) == 3:
+                return
+            try:
+                for sql in SQLITE_COMMENT_INDEX:
+                    cursor.execute(sql)
+            except DatabaseError:
+                # SQLite built without FTS5: comments are searched without an index
+                return
+            cursor.execute(f"INSERT INTO {COMMENT_FTS_TABLE}({COMMENT_FTS_TABLE}) VALUES ('rebuild')")
+
+
+def uninstall_search_indexes(connection):
+    with connection.cursor() as cursor:
+        for name in ('license_number_search_idx', 'customer_name_search_idx', 'product_name_search_idx'):
+            cursor.execute(f"DROP INDEX IF EXISTS {name}")
+        if connection.vendor == 'postgresql':
+            cursor.execute("DROP INDEX IF EXISTS license_comment_search_idx")
+        elif connection.vendor == 'sqlite':
+            for suffix in ('insert', 'delete', 'update'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {COMMENT_FTS_TABLE}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {COMMENT_FTS_TABLE}")
+
+
+def has_comment_index(connection):
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        return bool(_sqlite_names(cursor, 'table', COMMENT_FTS_TABLE))
+
+
+def comment_filter(term, using='default'):
+    """Q matching the licenses whose comment contains a word starting with ``term``."""
+    connection = connections[using]
+    if not has_comment_index(connection):
+        return Q(comment__icontains=term)
+    if connection.vendor == 'postgresql':
+        return Q(pk__in=RawSQL(
+            "SELECT id FROM license_app_license WHERE to_tsvector('simple', COALESCE(comment, '')) "
+            "@@ to_tsquery('simple', quote_literal(%s) || ':*')",
+            [term],
+        ))
+    # FTS5 prefix query on the term taken as a phrase, quotes doubled
+    query = '"' + term.replace('"', '""') + '"*'
+    return Q(pk__in=RawSQL(f"SELECT rowid FROM {COMMENT_FTS_TABLE} WHERE {COMMENT_FTS_TABLE} MATCH %s", [query]))
+
+
+def term_filter(term, using='default'):
+    """
+    Q matching one search term. Customer and product names are resolved in
+    subqueries on their own tables, so that every branch of the OR is an
+    indexed condition on the license table.
+    """
+    return (
+        Q(license_number__istartswith=term)
+        | Q(customer__in=Customer.objects.using(using).filter(name__istartswith=term).values('pk'))
+        | Q(product__in=Product.objects.using(using).filter(name__istartswith=term).values('pk'))
+        | comment_filter(term, using)
+    )
+
+
+def search_licenses(queryset, search_term):
+    """Filter ``queryset`` on every term of ``search_term``, split like the admin search box."""
+    for bit in smart_split(search_term):
+        if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+            bit = unescape_string_literal(bit)
+        if bit:
+            queryset = queryset.filter(term_filter(bit, queryset.db))
+    return queryset
+
+
+def explain_search(search_term):
+    """Query plan of a search, to check that it uses the search indexes."""
+    return search_licenses(License.objects.all(), search_term).explain()
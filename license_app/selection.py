@@ -0,0 +1,56 @@
+"""
+Declarative description of a selection of licenses, stored as JSON by the
+queued jobs (ExportJob, BulkJob) and turned back into a queryset by the
+worker. Nothing but plain values is stored, so a job neither depends on
+Django's Query internals nor runs code when it is loaded.
+
+A selection is either ``{'pks': [...]}`` (the licenses ticked in the admin)
+or ``{'filters': {...}, 'search': '...'}``: the changelist filters and search
+term, when "select all" was used.
+"""
+from django.contrib.admin.utils import prepare_lookup_value
+from django.contrib.admin.views.main import SEARCH_VAR
+from django.db.models.constants import LOOKUP_SEP
+
+from .models import License
+from .search import search_licenses
+
+
+# Fields LicenseAdmin can filter on (list_filter and date_hierarchy)
+FILTER_FIELDS = ('status', 'product', 'expiry_date')
+
+
+def _filter_params(request):
+    return {
+        key: value
+        for key, value in request.GET.items()
+        if key.split(LOOKUP_SEP)[0] in FILTER_FIELDS
+    }
+
+
+def selection_queryset(selection):
+    """Rebuild the licenses queryset described by ``selection``."""
+    queryset = License.objects.all()
+    if 'pks' in selection:
+        return queryset.filter(pk__in=selection['pks'])
+    for key, value in selection.get('filters', {}).items():
+        if key.split(LOOKUP_SEP)[0] not in FILTER_FIELDS:
+            raise ValueError(f"Filtre non autorisé : {key}")
+        queryset = queryset.filter(**{key: prepare_lookup_value(key, value)})
+    if selection.get('search'):
+        queryset = search_licenses(queryset, selection['search'])
+    return queryset
+
+
+def describe_selection(queryset, request=None):
+    """
+    Selection to store for the licenses of ``queryset``, an admin action
+    queryset when ``request`` is given. "Select all" is described by the
+    changelist filters and search term, checked to select the same number of
+    licenses; otherwise, or when they differ, the primary keys are stored.
+    """
+    if request is not None and request.POST.get('select_across') == '1':
+        selection = {'filters': _filter_params(request), 'search': request.GET.get(SEARCH_VAR, '')}
+        if selection_queryset(selection).count() == queryset.count():
+            return selection
+    return {'pks': list(queryset.order_by('pk').values_list('pk', flat=True))}
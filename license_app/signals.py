@@ -0,0 +1,35 @@
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from simple_history.signals import pre_create_historical_record
+
+from .cache import license_cache
+from .history import compact_record
+from .models import License
+from .search import install_search_indexes
+
+
+@receiver(post_save, sender=License)
+@receiver(post_delete, sender=License)
+def invalidate_license_cache(sender, instance, **kwargs):
+    # Invalidate by pk as well, in case the license number itself was changed
+    license_cache.invalidate(instance.license_number, pk=instance.pk)
+
+
+pre_create_historical_record.connect(compact_record, sender=License.history.model)
+
+
+
+@receiver(post_migrate)
+def restore_search_indexes(sender, using, **kwargs):
+    # SQLite rebuilds a table on most AlterField/RemoveField, dropping the search
+    # indexes and triggers created outside Meta.indexes: put back what is missing
+    if sender.name != 'license_app':
+        return
+    connection = connections[using]
+    applied = MigrationRecorder(connection).migration_qs.filter(
+        app='license_app', name='0013_license_search_index'
+    )
+    if applied.exists():
+        install_search_indexes(connection)
@@ -0,0 +1,427 @@
+import tempfile
+from io import StringIO
+
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from license_app.models import BulkJob, Customer, License, LicenseEvent, Product, ExportJob
+from django.utils import timezone
+from datetime import timedelta
+
+class LicenseAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='password')
+        self.client.login(username='admin', password='password')
+
+        self.product = Product.objects.create(name="Admin Product")
+        self.customer = Customer.objects.create(name="Admin Corp")
+        today = timezone.now().date()
+        self.licenses = [
+            License.objects.create(
+                license_number=f"LIC-ADM-{i}",
+                customer=self.customer,
+                product=self.product,
+                expiry_date=today + timedelta(days=i),
+                status='active'
+            )
+            for i in range(3)
+        ]
+
+    def run_action(self, action, licenses=None, **data):
+        licenses = self.licenses if licenses is None else licenses
+        return self.client.post('/admin/license_app/license/', {
+            'action': action,
+            '_selected_action': [license.pk for license in licenses],
+            **data,
+        })
+
+    def test_export_selected_to_csv_streams(self):
+        response = self.run_action('export_selected_to_csv')
+        self.assertTrue(response.streaming)
+        # The export itself runs while streaming, as a single joined query
+        with self.assertNumQueries(1):
+            content = b''.join(response.streaming_content).decode()
+        lines = content.strip().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertIn("LIC-ADM-0,Admin Corp,Admin Product", content)
+        self.assertTrue(any(line.endswith(",0") for line in lines))
+
+    def test_export_in_background(self):
+        response = self.run_action('export_in_background', licenses=self.licenses[:2], apply='1', format='csv')
+        self.assertEqual(response.status_code, 302)
+        job = ExportJob.objects.get()
+        self.assertEqual(job.status, 'pending')
+        self.assertEqual(job.created_by, self.admin)
+
+        with tempfile.TemporaryDirectory() as export_root, override_settings(LICENSE_EXPORT_ROOT=export_root):
+            call_command('run_export_jobs', '--once', stdout=StringIO())
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'done')
+            self.assertEqual((job.total, job.processed, job.progress()), (2, 2, 100))
+            self.assertContains(self.client.get('/admin/license_app/exportjob/'), "Télécharger")
+
+            response = self.client.get(f'/admin/license_app/exportjob/{job.pk}/download/')
+            content = b''.join(response.streaming_content).decode()
+            self.assertIn("LIC-ADM-0", content)
+            self.assertIn("LIC-ADM-1", content)
+            self.assertNotIn("LIC-ADM-2", content)
+
+    def test_export_job_stores_a_declarative_selection(self):
+        from license_app.selection import selection_queryset
+
+        self.run_action('export_in_background', licenses=self.licenses[:2], apply='1', format='csv')
+        self.assertEqual(ExportJob.objects.get().selection, {'pks': [self.licenses[0].pk, self.licenses[1].pk]})
+        ExportJob.objects.all().delete()
+
+        # "Select all" keeps the changelist filters and search term, not the primary keys
+        self.licenses[2].change_status('suspended')
+        self.client.post('/admin/license_app/license/?status__exact=active&q=lic-adm', {
+            'action': 'export_in_background', 'select_across': '1', 'index': 0,
+            '_selected_action': [self.licenses[0].pk], 'apply': '1', 'format': 'csv',
+        })
+        selection = ExportJob.objects.get().selection
+        self.assertEqual(selection, {'filters': {'status__exact': 'active'}, 'search': 'lic-adm'})
+        self.assertEqual(set(selection_queryset(selection)), set(self.licenses[:2]))
+        with self.assertRaises(ValueError):
+            selection_queryset({'filters': {'customer__users__password__startswith': 'x'}})
+
+    def test_admin_import_preview_shows_rows(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        rows = "license_number,customer,product,status\n" + "".join(
+            f"{number},{self.customer.pk},{self.product.pk},active\n" for number in ("LIC-ADM-0", "LIC-ADM-NEW")
+        )
+        response = self.client.post('/admin/license_app/license/import/', {
+            'import_file': SimpleUploadedFile('licenses.csv', rows.encode()), 'format': '0', 'resource': '0',
+        })
+        self.assertEqual(response.status_code, 200)
+        result = response.context['result']
+        self.assertEqual((result.totals['new'], result.totals['skip']), (1, 1))
+        self.assertContains(response, "LIC-ADM-NEW")
+        self.assertFalse(License.objects.filter(license_number="LIC-ADM-NEW").exists())
+
+    def test_export_job_xlsx(self):
+        from openpyxl import load_workbook
+
+        self.run_action('export_in_background', apply='1', format='xlsx')
+        with tempfile.TemporaryDirectory() as export_root, override_settings(LICENSE_EXPORT_ROOT=export_root):
+            call_command('run_export_jobs', '--once', stdout=StringIO())
+            job = ExportJob.objects.get()
+            self.assertEqual(job.status, 'done', job.error)
+            rows = list(load_workbook(job.file_path, read_only=True).active.values)
+            self.assertEqual(len(rows), 4)
+            self.assertEqual(rows[0][0], "Numéro")
+
+    def assertHistory(self, license, reason, **fields):
+        record = license.history.first()
+        self.assertEqual(license.history.count(), 2)
+        self.assertEqual(record.history_user, self.admin)
+        self.assertEqual(record.history_change_reason, reason)
+        for name, value in fields.items():
+            self.assertEqual(getattr(record, name), value)
+
+    def test_set_product_writes_history(self):
+        new_product = Product.objects.create(name="New Product")
+        self.run_action('set_product', apply='1', new_product=new_product.pk)
+        for license in self.licenses:
+            license.refresh_from_db()
+            self.assertEqual(license.product, new_product)
+            self.assertHistory(license, "Modification du produit en masse", product_id=new_product.pk)
+
+    def test_suspend_and_activate_write_history(self):
+        self.run_action('suspend_licenses')
+        for license in self.licenses:
+            self.assertHistory(license, "Suspension en masse", status='suspended')
+
+        self.run_action('activate_licenses')
+        for license in self.licenses:
+            self.assertEqual(license.history.count(), 3)
+            self.assertEqual(license.history.first().status, 'active')
+
+    def test_bulk_change_status_writes_history(self):
+        self.run_action('bulk_change_status', apply='1', new_status='pending', comment="Audit")
+        for license in self.licenses:
+            self.assertHistory(license, "Changement de statut en masse", status='pending')
+
+    def test_extend_writes_history(self):
+        self.run_action('bulk_update_dates', apply='1', date_action='extend', extension_days=10)
+        for license in self.licenses:
+            old_expiry = license.expiry_date
+            license.refresh_from_db()
+            self.assertEqual(license.expiry_date, old_expiry + timedelta(days=10))
+            self.assertHistory(license, "Prolongation de 10 jours", expiry_date=license.expiry_date)
+
+    def test_extend_recomputes_status_in_sql(self):
+        today = timezone.now().date()
+        overdue = License.objects.create(
+            license_number="LIC-ADM-OLD", customer=self.customer, product=self.product,
+            start_date=today - timedelta(days=90), expiry_date=today - timedelta(days=30), status='active',
+        )
+        self.run_action('bulk_update_dates', [overdue, self.licenses[0]], apply='1', date_action='extend', extension_days=10)
+        overdue.refresh_from_db()
+        self.assertEqual(overdue.expiry_date, today - timedelta(days=20))
+        self.assertEqual(overdue.status, 'expired')
+        self.assertEqual(overdue.history.first().status, 'expired')
+        self.licenses[0].refresh_from_db()
+        self.assertEqual(self.licenses[0].status, 'active')
+
+    def test_set_expiry_in_the_past_expires(self):
+        past = timezone.now().date() - timedelta(days=1)
+        self.run_action('bulk_update_dates', apply='1', date_action='set_expiry', expiry_date=past)
+        for license in self.licenses:
+            license.refresh_from_db()
+            self.assertEqual(license.status, 'expired')
+            self.assertHistory(license, "Modification de la date d'expiration en masse", expiry_date=past, status='expired')
+
+    def test_bulk_change_status_logs_events(self):
+        License.objects.filter(pk=self.licenses[0].pk).update(comment="Note libre")
+        self.run_action('bulk_change_status', apply='1', new_status='suspended', comment="Audit")
+        first = License.objects.get(pk=self.licenses[0].pk)
+        # The comment is left alone, so history rows no longer grow with every change
+        self.assertEqual(first.comment, "Note libre")
+        self.assertEqual(LicenseEvent.objects.count(), 3)
+        event = first.events.get()
+        self.assertEqual((event.status, event.author, event.message), ('suspended', self.admin, "Audit"))
+
+        response = self.client.get(f'/admin/license_app/license/{first.pk}/change/')
+        self.assertContains(response, "Audit")
+        response = self.client.get(f'/admin/license_app/licenseevent/?license__id__exact={first.pk}')
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_date_update_queries_do_not_grow_with_selection(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        def extend(licenses):
+            with CaptureQueriesContext(connection) as queries:
+                self.run_action('bulk_update_dates', licenses, apply='1', date_action='extend', extension_days=1)
+            return len(queries)
+
+        few = extend(self.licenses[:1])
+        today = timezone.now().date()
+        more = [
+            License.objects.create(
+                license_number=f"LIC-ADM-BULK-{i}", customer=self.customer, expiry_date=today, status='active',
+            )
+            for i in range(20)
+        ]
+        self.assertEqual(extend(more), few)
+
+    def test_confirmation_page_forwards_select_across(self):
+        response = self.client.post('/admin/license_app/license/', {
+            'action': 'bulk_change_status', 'select_across': '1', 'index': 0,
+            '_selected_action': [self.licenses[0].pk],
+        })
+        self.assertContains(response, 'name="select_across" value="1"')
+        self.assertNotContains(response, 'name="_selected_action"')
+        self.assertContains(response, "Licences sélectionnées (3)")
+
+    @override_settings(LICENSE_BULK_JOB_THRESHOLD=2)
+    def test_large_selection_runs_in_worker(self):
+        new_product = Product.objects.create(name="Queued Product")
+        response = self.run_action('set_product', apply='1', new_product=new_product.pk)
+        self.assertEqual(response.status_code, 302)
+        job = BulkJob.objects.get()
+        self.assertEqual((job.action, job.status, job.created_by), ('set_product', 'pending', self.admin))
+        self.assertFalse(License.objects.filter(product=new_product).exists())
+
+        call_command('run_worker', '--once', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done', job.error)
+        self.assertEqual((job.total, job.processed), (3, 3))
+        for license in self.licenses:
+            license.refresh_from_db()
+            self.assertHistory(license, "Modification du produit en masse", product_id=new_product.pk)
+
+        # The result is shown once, on the next visit of the changelist
+        response = self.client.get('/admin/license_app/license/')
+        self.assertContains(response, "3 licence(s) mise(s) à jour avec le produit « Queued Product »")
+        response = self.client.get('/admin/license_app/license/')
+        self.assertNotContains(response, "Queued Product »")
+
+    @override_settings(LICENSE_BULK_JOB_THRESHOLD=1)
+    def test_queued_job_stores_a_declarative_selection(self):
+        self.run_action('bulk_change_status', licenses=self.licenses[:2], apply='1', new_status='suspended')
+        self.assertEqual(BulkJob.objects.get().selection, {'pks': [self.licenses[0].pk, self.licenses[1].pk]})
+        BulkJob.objects.all().delete()
+
+        self.licenses[2].change_status('expired')
+        self.client.post('/admin/license_app/license/?status__exact=active', {
+            'action': 'bulk_change_status', 'select_across': '1', 'index': 0,
+            '_selected_action': [self.licenses[0].pk], 'apply': '1', 'new_status': 'suspended',
+        })
+        job = BulkJob.objects.get()
+        self.assertEqual(job.selection, {'filters': {'status__exact': 'active'}, 'search': ''})
+        call_command('run_worker', '--once', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done', job.error)
+        self.assertEqual(
+            sorted(License.objects.values_list('license_number', 'status')),
+            [("LIC-ADM-0", 'suspended'), ("LIC-ADM-1", 'suspended'), ("LIC-ADM-2", 'expired')],
+        )
+
+    @override_settings(LICENSE_BULK_JOB_THRESHOLD=2)
+    def test_failed_job_is_reported(self):
+        self.run_action('bulk_update_dates', apply='1', date_action='extend', extension_days=5)
+        BulkJob.objects.update(params={'date_action': 'extend'})
+        call_command('run_worker', '--once', stdout=StringIO())
+        self.assertEqual(BulkJob.objects.get().status, 'failed')
+        self.assertContains(self.client.get('/admin/license_app/license/'), "a échoué")
+
+    def test_jobs_are_claimed_once(self):
+        from license_app.jobs import claim_next
+
+        job = BulkJob.objects.create(action='bulk_change_status', params={'status': 'active'})
+        claimed = claim_next(BulkJob)
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.status, 'running')
+        self.assertIsNone(claim_next(BulkJob))
+
+    def test_license_with_events_can_be_deleted(self):
+        from django.contrib import admin
+
+        license = self.licenses[0]
+        event = license.change_status('suspended', "Impayé")
+        response = self.client.get(f'/admin/license_app/licenseevent/{event.pk}/delete/')
+        self.assertEqual(response.status_code, 403)
+        request = self.client.get('/admin/license_app/licenseevent/').wsgi_request
+        self.assertNotIn('delete_selected', admin.site._registry[LicenseEvent].get_actions(request))
+
+        response = self.client.post(f'/admin/license_app/license/{license.pk}/delete/', {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(LicenseEvent.objects.exists())
+        response = self.client.post(f'/admin/license_app/customer/{self.customer.pk}/delete/', {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(License.objects.exists())
+
+    def test_job_of_a_dead_worker_is_marked_failed(self):
+        now = timezone.now()
+        job = BulkJob.objects.create(
+            action='bulk_change_status', params={'status': 'active'}, created_by=self.admin,
+            status='running', started_at=now - timedelta(hours=7), heartbeat_at=now - timedelta(hours=2),
+        )
+        export = ExportJob.objects.create(status='running', started_at=now - timedelta(hours=2))
+        call_command('run_worker', '--once', stdout=StringIO())
+        job.refresh_from_db()
+        export.refresh_from_db()
+        self.assertEqual((job.status, job.error), ('failed', BulkJob.STALE_ERROR))
+        self.assertEqual((export.status, export.error), ('failed', ExportJob.STALE_ERROR))
+        self.assertContains(self.client.get('/admin/license_app/license/'), "le worker s&#x27;est arrêté")
+
+    def test_long_job_with_recent_progress_is_not_failed(self):
+        from license_app.jobs import fail_stale_jobs
+
+        now = timezone.now()
+        job = BulkJob.objects.create(
+            action='bulk_change_status', params={'status': 'active'},
+            status='running', started_at=now - timedelta(hours=7), heartbeat_at=now - timedelta(minutes=1),
+        )
+        self.assertEqual(fail_stale_jobs(BulkJob), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+
+    def test_job_failed_while_running_stays_failed(self):
+        from license_app.jobs import claim_next, fail_stale_jobs, run_bulk_job
+
+        BulkJob.objects.create(
+            action='bulk_change_status', params={'status': 'suspended'}, selection={'pks': [self.licenses[0].pk]},
+        )
+        job = claim_next(BulkJob)
+        BulkJob.objects.update(heartbeat_at=timezone.now() - timedelta(hours=2))
+        fail_stale_jobs(BulkJob)
+        self.assertFalse(run_bulk_job(job))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ('failed', BulkJob.STALE_ERROR))
+
+    def test_history_view_rebuilds_delta_records(self):
+        license = self.licenses[0]
+        self.run_action('suspend_licenses', [license])
+        self.run_action('activate_licenses', [license])
+        response = self.client.get(f'/admin/license_app/license/{license.pk}/history/')
+        records = list(response.context['page_obj'])
+        self.assertEqual(len(records), 3)
+        self.assertTrue(records[0].history_delta)
+        self.assertTrue(all(record.license_number == "LIC-ADM-0" for record in records))
+        # Only the status differs between consecutive versions, not the fields the delta left empty
+        changed = {str(change['field']) for change in records[0].history_delta_changes}
+        self.assertEqual(changed, {"Statut"})
+
+        record = records[1]
+        response = self.client.get(f'/admin/license_app/license/{license.pk}/history/{record.history_id}/')
+        self.assertContains(response, "LIC-ADM-0")
+
+    def test_changelist_queries_do_not_grow_with_page_size(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        def changelist():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/admin/license_app/license/')
+            self.assertEqual(response.status_code, 200)
+            return response, len(queries)
+
+        response, few = changelist()
+        self.assertContains(response, "🟠 Expire dans 1 jours")
+        today = timezone.now().date()
+        for i in range(40):
+            customer = Customer.objects.create(name=f"Page Corp {i}")
+            License.objects.create(
+                license_number=f"LIC-PAGE-{i}", customer=customer, product=self.product,
+                expiry_date=today + timedelta(days=i * 10 - 100),
+            )
+        response, more = changelist()
+        self.assertEqual(more, few)
+        self.assertContains(response, "🟢 Expire dans 290 jours")
+        self.assertContains(response, "🔴 Expirée")
+
+    def test_expiry_annotation_matches_python(self):
+        today = timezone.now().date()
+        License.objects.create(license_number="LIC-ADM-NONE", customer=self.customer)
+        License.objects.create(license_number="LIC-ADM-60", customer=self.customer, expiry_date=today + timedelta(days=60))
+        for annotated in License.objects.with_expiry():
+            plain = License.objects.get(pk=annotated.pk)
+            self.assertEqual(annotated.days_until_expiry(), plain.days_until_expiry())
+            self.assertEqual(annotated.expiry_status(), plain.expiry_status())
+
+    def search(self, term):
+        response = self.client.get('/admin/license_app/license/', {'q': term})
+        self.assertEqual(response.status_code, 200)
+        return {license.license_number for license in response.context['cl'].result_list}
+
+    def test_search_by_prefix_customer_product_and_comment(self):
+        other = License.objects.create(
+            license_number="XYZ-001", customer=Customer.objects.create(name="Zeta Industries"),
+            product=Product.objects.create(name="Cloud Suite"), comment="Renouvellement négocié par Martin",
+        )
+        all_admin = {"LIC-ADM-0", "LIC-ADM-1", "LIC-ADM-2"}
+        self.assertEqual(self.search("lic-adm"), all_admin)
+        self.assertEqual(self.search('"admin corp"'), all_admin)
+        self.assertEqual(self.search("admin corp"), set())  # "corp" starts no field
+        self.assertEqual(self.search("zeta"), {"XYZ-001"})
+        self.assertEqual(self.search("cloud"), {"XYZ-001"})
+        self.assertEqual(self.search("renouvel"), {"XYZ-001"})
+        self.assertEqual(self.search("adm-"), set())  # prefix only, not a substring of LIC-ADM-
+        # Terms are ANDed, each one matching any of the fields
+        self.assertEqual(self.search("xyz martin"), {"XYZ-001"})
+        self.assertEqual(self.search("zeta admin"), set())
+
+        # The comment index follows updates and deletions
+        other.comment = "Client historique"
+        other.save()
+        self.assertEqual(self.search("renouvel"), set())
+        self.assertEqual(self.search("historique"), {"XYZ-001"})
+        other.delete()
+        self.assertEqual(self.search("historique"), set())
+
+    def test_search_uses_indexes(self):
+        from django.db import connection
+        from license_app.search import explain_search
+
+        if connection.vendor != 'sqlite':
+            self.skipTest("query plan checked on SQLite")
+        plan = explain_search("abc")
+        self.assertIn("license_number_search_idx", plan)
+        self.assertIn("customer_name_search_idx", plan)
+        self.assertIn("product_name_search_idx", plan)
+        self.assertIn("license_comment_fts", plan)
+        self.assertNotIn("SCAN license_app_license", plan)
@@ -1,7 +1,13 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.core import mail
 from django.core.management import call_command
-from license_app.models import Customer, License, Product, ClientType
+from license_app.models import Customer, License, Product, ClientType, LicenseToken, ExpirationAlert
+from license_app.tokens import issue_license_token, verify_license_token
+from django.core import signing
+from django.core.mail import EmailMessage
+from django.contrib.auth.models import User
+from license_app.mailing import deliver_messages
+from license_app.bulk import update_with_history
 from django.utils import timezone
 from datetime import timedelta
 from io import StringIO
@@ -56,3 +62,332 @@ class FeatureTests(TestCase):
         # Check admin email
         admin_email = mail.outbox[1]
         self.assertIn("licences expirent bientôt", admin_email.subject)
+
+    def test_offline_token_roundtrip(self):
+        """Test that a signed token can be verified without the database."""
+        license = License.objects.create(
+            license_number="LIC-TOKEN-1",
+            customer=self.customer,
+            product=self.product,
+            expiry_date=timezone.now().date() + timedelta(days=10),
+            status='active'
+        )
+        token = issue_license_token(license)
+
+        with self.assertNumQueries(0):
+            data = verify_license_token(token)
+        self.assertEqual(data['license_number'], "LIC-TOKEN-1")
+        self.assertEqual(data['product'], "Feature Product")
+        self.assertTrue(data['valid'])
+
+        with self.assertRaises(signing.BadSignature):
+            verify_license_token(token[:-2] + "xx")
+
+        # Tokens expire after LICENSE_TOKEN_MAX_AGE, so a suspension cannot be ignored forever
+        with override_settings(LICENSE_TOKEN_MAX_AGE=-1), self.assertRaises(signing.SignatureExpired):
+            verify_license_token(token)
+
+    def test_issue_license_tokens_command(self):
+        """Test that tokens are re-issued only for licenses changed since their last token."""
+        license = License.objects.create(
+            license_number="LIC-TOKEN-2",
+            customer=self.customer,
+            product=self.product,
+            expiry_date=timezone.now().date() + timedelta(days=10),
+            status='active'
+        )
+        out = StringIO()
+        call_command('issue_license_tokens', stdout=out)
+        self.assertIn("1 token(s) issued", out.getvalue())
+
+        call_command('issue_license_tokens', stdout=out)
+        self.assertIn("0 token(s) issued", out.getvalue())
+
+        license.change_status('suspended')
+        call_command('issue_license_tokens', stdout=out)
+        token = LicenseToken.objects.get(license=license).token
+        self.assertEqual(verify_license_token(token)['status'], 'suspended')
+
+        # Tokens past half their lifetime are renewed even when the license did not change
+        LicenseToken.objects.update(issued_at=timezone.now() - timedelta(days=5))
+        call_command('issue_license_tokens', stdout=out)
+        self.assertIn("1 token(s) issued", out.getvalue().splitlines()[-1])
+
+    def test_expire_licenses_command(self):
+        """Test that overdue active licenses are expired in bulk with history."""
+        today = timezone.now().date()
+        overdue = License.objects.create(license_number="LIC-SWEEP-1", customer=self.customer, product=self.product)
+        current = License.objects.create(
+            license_number="LIC-SWEEP-2",
+            customer=self.customer,
+            product=self.product,
+            expiry_date=today + timedelta(days=5),
+        )
+        # save() would flip the status itself, so backdate without it
+        License.objects.filter(pk=overdue.pk).update(expiry_date=today - timedelta(days=3))
+
+        out = StringIO()
+        call_command('expire_licenses', '--chunk-size', '1', stdout=out)
+        self.assertIn("1 licence(s) marked as expired", out.getvalue())
+
+        overdue.refresh_from_db()
+        current.refresh_from_db()
+        self.assertEqual(overdue.status, 'expired')
+        self.assertEqual(current.status, 'active')
+        self.assertEqual(overdue.history.count(), 2)
+        self.assertEqual(overdue.history.first().status, 'expired')
+        self.assertEqual(overdue.history.first().history_change_reason, "Expiration automatique")
+
+    def test_expiry_skips_licenses_changed_after_the_chunk_was_read(self):
+        """Test that the bulk UPDATE re-applies its filter and only writes history for the rows it changed."""
+        from unittest import mock
+        from license_app.bulk import expire_overdue_licenses
+
+        today = timezone.now().date()
+        licenses = [
+            License.objects.create(license_number=f"LIC-RACE-{i}", customer=self.customer, product=self.product)
+            for i in range(2)
+        ]
+        License.objects.update(expiry_date=today - timedelta(days=3))
+        renewed = licenses[1]
+        now = timezone.now
+
+        def renew_then_now():
+            # Renewed by someone else between the chunk SELECT and its UPDATE
+            License.objects.filter(pk=renewed.pk).update(expiry_date=today + timedelta(days=30))
+            return now()
+
+        with mock.patch('license_app.bulk.timezone.now', side_effect=renew_then_now):
+            self.assertEqual(expire_overdue_licenses(today=today), 1)
+
+        renewed.refresh_from_db()
+        self.assertEqual(renewed.status, 'active')
+        self.assertEqual(renewed.history.count(), 1)
+        self.assertEqual(licenses[0].history.first().status, 'expired')
+
+    def test_change_status_logs_event(self):
+        """Test that change_status records an event instead of growing the comment."""
+        user = User.objects.create_user(username="auditor")
+        license = License.objects.create(license_number="LIC-EVT-1", customer=self.customer, product=self.product)
+        license.change_status('suspended', "Impayé", author=user)
+
+        license.refresh_from_db()
+        self.assertIsNone(license.comment)
+        event = license.events.get()
+        self.assertEqual((event.status, event.author, event.message), ('suspended', user, "Impayé"))
+
+        unsaved = license.change_status('active', save=False)
+        self.assertIsNone(unsaved.pk)
+        self.assertEqual(license.events.count(), 1)
+
+    def test_comment_migration_splits_events(self):
+        """Test that the data migration turns timestamped comment lines into events."""
+        from django.apps import apps
+        from importlib import import_module
+        migration = import_module('license_app.migrations.0011_split_license_comments')
+
+        license = License.objects.create(
+            license_number="LIC-EVT-2",
+            customer=self.customer,
+            comment="Client historique\n[2024-01-02 10:30] Audit\nsuite\n[2024-02-03 11:00] Renouvelée",
+        )
+        migration.comments_to_events(apps, None)
+        license.refresh_from_db()
+        self.assertEqual(license.comment, "Client historique")
+        events = list(license.events.order_by('created_at'))
+        self.assertEqual([e.message for e in events], ["Audit\nsuite", "Renouvelée"])
+        self.assertEqual(events[0].created_at.strftime('%Y-%m-%d %H:%M'), "2024-01-02 10:30")
+
+        migration.events_to_comments(apps, None)
+        license.refresh_from_db()
+        self.assertEqual(
+            license.comment, "Client historique\n[2024-01-02 10:30] Audit\nsuite\n[2024-02-03 11:00] Renouvelée"
+        )
+
+    def test_prune_history_archives_old_records(self):
+        """Test that old history is archived and deleted, keeping the latest record of each object."""
+        import gzip
+        import json
+        import tempfile
+        from pathlib import Path
+
+        HistoricalLicense = License.history.model
+        license = License.objects.create(license_number="LIC-PRUNE-1", customer=self.customer)
+        license.suspend()
+        license.activate()
+        untouched = License.objects.create(license_number="LIC-PRUNE-2", customer=self.customer)
+        HistoricalLicense.objects.update(history_date=timezone.now() - timedelta(days=400))
+        license.change_status('pending')
+
+        out = StringIO()
+        call_command('prune_history', '--days', '365', '--dry-run', stdout=out)
+        self.assertIn("3 record(s) would be deleted", out.getvalue())
+
+        with tempfile.TemporaryDirectory() as archive_dir:
+            call_command('prune_history', '--days', '365', '--batch-size', '2', '--pause', '0',
+                         '--archive-dir', archive_dir, stdout=out)
+            # Only the latest record of each license (however old) and the recent change remain
+            self.assertEqual(license.history.count(), 1)
+            self.assertEqual(license.history.get().status, 'pending')
+            self.assertEqual(untouched.history.count(), 1)
+
+            archive, = Path(archive_dir).glob('license_app.historicallicense_*.jsonl.gz')
+            with gzip.open(archive, 'rt') as f:
+                rows = [json.loads(line) for line in f]
+            self.assertEqual([row['status'] for row in rows], ['active', 'suspended', 'active'])
+            self.assertEqual([row['history_delta'] is None for row in rows], [True, False, False])
+            # The delta record left without its base was turned into a full record
+            kept = license.history.get()
+            self.assertIsNone(kept.history_delta)
+            self.assertEqual(kept.license_number, "LIC-PRUNE-1")
+            self.assertFalse(list(Path(archive_dir).glob('license_app.historicalcustomer_*')))
+
+    def test_delta_history(self):
+        """Test that changes store only the modified fields and full versions are rebuilt on demand."""
+        license = License.objects.create(
+            license_number="LIC-DELTA-1", customer=self.customer, product=self.product, comment="Long commentaire",
+        )
+        created = timezone.now()
+        license = License.objects.get(pk=license.pk)
+        license.status = 'suspended'
+        license.save()
+
+        record = license.history.first()
+        self.assertEqual(sorted(record.history_delta), ['status', 'updated_at'])
+        self.assertIsNone(record.comment)
+        self.assertIsNone(record.license_number)
+        self.assertIsNone(license.history.last().history_delta)
+
+        update_with_history(License.objects.filter(pk=license.pk), {'status': 'active'}, reason="Réactivation")
+        version = license.history_version()
+        self.assertEqual(sorted(version.history_delta), ['status', 'updated_at'])
+        self.assertEqual((version.status, version.comment, version.product_id), ('active', "Long commentaire", self.product.pk))
+        self.assertEqual(version.instance.license_number, "LIC-DELTA-1")
+        self.assertEqual(license.history_version(created).status, 'active')
+        self.assertEqual(license.history.as_of(timezone.now()).comment, "Long commentaire")
+
+        with self.settings(LICENSE_HISTORY_MODE='full'):
+            license = License.objects.get(pk=license.pk)
+            license.suspend()
+            self.assertIsNone(license.history.first().history_delta)
+            self.assertEqual(license.history.first().comment, "Long commentaire")
+
+    def test_bulk_update_commits_per_chunk(self):
+        """Test that bulk updates run chunk by chunk, recording progress and keeping finished chunks."""
+        licenses = [
+            License.objects.create(license_number=f"LIC-CHUNK-{i}", customer=self.customer, product=self.product)
+            for i in range(5)
+        ]
+        progress = []
+        updated = update_with_history(
+            License.objects.all(), {'status': 'suspended'}, chunk_size=2, progress=lambda *p: progress.append(p),
+        )
+        self.assertEqual(updated, 5)
+        self.assertEqual(progress, [(2, 5), (4, 5), (5, 5)])
+
+        def fail_on_second_chunk(processed, total):
+            if processed > 2:
+                raise RuntimeError("interrupted")
+        # The progress callback runs after the chunk commit, so the failure only stops the run
+        with self.assertRaises(RuntimeError):
+            update_with_history(License.objects.all(), {'status': 'active'}, chunk_size=2, progress=fail_on_second_chunk)
+        statuses = [license.status for license in License.objects.order_by('pk')]
+        self.assertEqual(statuses, ['active'] * 4 + ['suspended'])
+        self.assertEqual(licenses[0].history.count(), 3)
+
+    def test_check_expirations_query_count(self):
+        """Test that check_expirations runs a constant number of queries."""
+        today = timezone.now().date()
+        for i in range(5):
+            License.objects.create(
+                license_number=f"LIC-N1-{i}",
+                customer=self.customer,
+                product=self.product,
+                expiry_date=today + timedelta(days=i + 1),
+                status='active'
+            )
+
+        out = StringIO()
+        # Expiring licenses, expired licenses, alert ledger insert
+        with self.assertNumQueries(3):
+            call_command('check_expirations', stdout=out)
+        self.assertIn("FOUND 5 EXPIRING", out.getvalue())
+        self.assertIn("3 queries", out.getvalue())
+        self.assertEqual(len(mail.outbox), 6)
+
+    def test_pooled_concurrent_delivery(self):
+        """Test that batched, threaded delivery sends every message once."""
+        messages = [
+            EmailMessage(f"Alert {i}", "Body", "from@example.com", [f"user{i}@example.com"])
+            for i in range(7)
+        ]
+        report = deliver_messages(messages, batch_size=2, concurrency=3, rate_limit=1000)
+        self.assertEqual(report.sent, 7)
+        self.assertEqual(report.failed, [])
+        self.assertEqual(sorted(m.subject for m in mail.outbox), sorted(m.subject for m in messages))
+
+    def test_check_expirations_delivery_options(self):
+        """Test that check_expirations accepts the delivery options."""
+        today = timezone.now().date()
+        for i in range(3):
+            License.objects.create(
+                license_number=f"LIC-POOL-{i}",
+                customer=self.customer,
+                product=self.product,
+                expiry_date=today + timedelta(days=3),
+            )
+        out = StringIO()
+        call_command('check_expirations', '--batch-size', '2', '--concurrency', '2', stdout=out)
+        self.assertIn("3 alert email(s) sent", out.getvalue())
+        self.assertEqual(len(mail.outbox), 4)
+
+    def test_check_expirations_digest(self):
+        """Test that digest mode sends one email per customer, optionally to its users."""
+        today = timezone.now().date()
+        user = User.objects.create_user(username='digest', email='digest-user@example.com', password='password')
+        self.customer.users.add(user)
+        for i in range(3):
+            License.objects.create(
+                license_number=f"LIC-DIGEST-{i}",
+                customer=self.customer,
+                product=self.product,
+                expiry_date=today + timedelta(days=i + 1),
+            )
+
+        out = StringIO()
+        with self.assertNumQueries(4):
+            call_command('check_expirations', '--digest', '--include-users', stdout=out)
+
+        # 1 digest to the customer, 1 summary to admin
+        self.assertEqual(len(mail.outbox), 2)
+        digest = mail.outbox[0]
+        self.assertEqual(digest.to, ["feature@example.com", "digest-user@example.com"])
+        for i in range(3):
+            self.assertIn(f"LIC-DIGEST-{i}", digest.body)
+
+    def test_check_expirations_alert_ledger(self):
+        """Test that a license is alerted once per threshold, and again after renewal."""
+        today = timezone.now().date()
+        license = License.objects.create(
+            license_number="LIC-LEDGER-1",
+            customer=self.customer,
+            product=self.product,
+            expiry_date=today + timedelta(days=20),
+        )
+        out = StringIO()
+        call_command('check_expirations', stdout=out)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(ExpirationAlert.objects.get(license=license).threshold, 30)
+
+        # Same threshold: nothing new to send
+        call_command('check_expirations', stdout=out)
+        self.assertEqual(len(mail.outbox), 2)
+
+        # Crossing the 7 days threshold triggers a new alert
+        License.objects.filter(pk=license.pk).update(expiry_date=today + timedelta(days=5))
+        call_command('check_expirations', stdout=out)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(ExpirationAlert.objects.filter(license=license).count(), 2)
+
+        call_command('check_expirations', '--resend', stdout=out)
+        self.assertEqual(len(mail.outbox), 6)
@@ -0,0 +1,268 @@
+import csv
+import os
+import tempfile
+
+import tablib
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase
+from django.utils import timezone
+from datetime import timedelta
+from license_app.import_pipeline import ImportAborted, stream_import
+from license_app.import_validation import validate_chunk
+from license_app.resources import LicenseResource
+from license_app.models import Customer, License, Product
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Import Corp")
+        self.other_customer = Customer.objects.create(name="Other Import Corp")
+        self.product = Product.objects.create(name="Import Product")
+        self.today = timezone.now().date()
+        License.objects.create(
+            license_number="LIC-IMP-0",
+            customer=self.customer,
+            product=self.product,
+            expiry_date=self.today + timedelta(days=10),
+        )
+
+    def make_dataset(self, count, customer=None):
+        customer = customer or self.customer
+        dataset = tablib.Dataset(headers=['license_number', 'customer', 'product', 'expiry_date', 'status'])
+        for i in range(count):
+            dataset.append([
+                f"LIC-IMP-{i}", customer.pk, self.product.pk,
+                (self.today + timedelta(days=10)).isoformat(), 'active',
+            ])
+        return dataset
+
+    def test_import_query_count_does_not_depend_on_row_count(self):
+        dataset = self.make_dataset(120)
+        with CaptureQueriesContext(connection) as queries:
+            result = LicenseResource().import_data(dataset, dry_run=False)
+        # Licenses, customers, products and the batched inserts, plus savepoints
+        self.assertLessEqual(len(queries), 15)
+        self.assertFalse(result.has_errors())
+        self.assertFalse(result.has_validation_errors())
+        self.assertEqual(result.totals['new'], 119)
+        self.assertEqual(result.totals['skip'], 1)
+        self.assertEqual(License.objects.count(), 120)
+
+    def test_import_updates_existing_rows_in_bulk(self):
+        result = LicenseResource().import_data(self.make_dataset(3, self.other_customer), dry_run=False)
+        self.assertFalse(result.has_errors())
+        self.assertEqual(result.totals['update'], 1)
+        self.assertEqual(License.objects.get(license_number="LIC-IMP-0").customer, self.other_customer)
+
+    def test_import_writes_history_in_bulk(self):
+        user = User.objects.create_user(username='importer')
+        LicenseResource().import_data(self.make_dataset(3, self.other_customer), dry_run=False, user=user)
+        records = License.history.filter(history_change_reason="Import de licences")
+        numbers = dict(License.objects.values_list('pk', 'license_number'))
+        self.assertEqual(sorted((numbers[pk], kind) for pk, kind in records.values_list('id', 'history_type')), [
+            ("LIC-IMP-0", '~'), ("LIC-IMP-1", '+'), ("LIC-IMP-2", '+'),
+        ])
+        self.assertEqual({record.history_user for record in records}, {user})
+        update = records.get(history_type='~')
+        self.assertEqual(update.instance.customer, self.other_customer)
+        self.assertEqual(update.prev_record.customer, self.customer)
+        self.assertEqual(update.history_delta, ['customer_id', 'updated_at'])
+
+    def test_import_applies_expiry_status(self):
+        dataset = self.make_dataset(1)
+        dataset.append(["LIC-IMP-OLD", self.customer.pk, '', (self.today - timedelta(days=1)).isoformat(), 'active'])
+        LicenseResource().import_data(dataset, dry_run=False)
+        self.assertEqual(License.objects.get(license_number="LIC-IMP-OLD").status, 'expired')
+
+    def test_import_reports_unknown_customer(self):
+        dataset = self.make_dataset(1)
+        dataset.append(["LIC-IMP-X", 9999, self.product.pk, '', 'active'])
+        result = LicenseResource().import_data(dataset, dry_run=False)
+        self.assertTrue(result.has_errors())
+        self.assertEqual(result.totals['error'], 1)
+        self.assertFalse(License.objects.filter(license_number="LIC-IMP-X").exists())
+
+
+class StreamingImportTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Stream Corp")
+        self.product = Product.objects.create(name="Stream Product")
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write_csv(self, rows):
+        path = os.path.join(self.tmpdir.name, 'licenses.csv')
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['license_number', 'customer', 'product', 'expiry_date', 'status'])
+            writer.writerows(rows)
+        return path
+
+    def row(self, i, customer=None):
+        return [f"LIC-STR-{i}", customer or self.customer.pk, self.product.pk, '2099-01-01', 'active']
+
+    def test_csv_import_by_chunks(self):
+        path = self.write_csv([self.row(i) for i in range(5)])
+        chunks = []
+        totals = stream_import(path, chunk_size=2, on_chunk=lambda done, totals: chunks.append(done))
+        self.assertEqual(chunks, [2, 4, 5])
+        self.assertEqual(totals['new'], 5)
+        self.assertEqual(License.objects.count(), 5)
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+    def test_chunks_before_a_failing_one_stay_committed(self):
+        rows = [self.row(i) for i in range(7)]
+        rows[5] = self.row(5, customer=9999)
+        path = self.write_csv(rows)
+
+        chunks = []
+        with self.assertRaises(ImportAborted) as ctx:
+            stream_import(path, chunk_size=2, on_chunk=lambda done, totals: chunks.append(done))
+        self.assertEqual(chunks, [2, 4])
+        self.assertIn("Ligne 7 (customer)", str(ctx.exception))  # data row 6, after the header
+        self.assertEqual(
+            sorted(License.objects.values_list('license_number', flat=True)),
+            [f"LIC-STR-{i}" for i in range(4)],
+        )
+
+    def test_blank_lines_are_skipped_and_lines_still_counted(self):
+        rows = [self.row(0), [], self.row(1, customer=9999), [], ['', '']]
+        path = self.write_csv(rows)
+        with self.assertRaises(ImportAborted) as ctx:
+            stream_import(path)
+        self.assertEqual(str(ctx.exception), "Ligne 4 (customer): Client introuvable.")
+
+        rows[2] = self.row(1)
+        path = self.write_csv(rows)
+        self.assertEqual(stream_import(path)['new'], 2)
+
+    def test_rows_with_a_wrong_number_of_columns_are_reported(self):
+        rows = [self.row(0), self.row(1)[:4], self.row(2) + ['extra'], self.row(3) + ['', None]]
+        with self.assertRaises(ImportAborted) as ctx:
+            stream_import(self.write_csv(rows))
+        self.assertEqual(str(ctx.exception), "Ligne 3 (colonnes): 4 colonne(s) au lieu de 5.\nLigne 4 (colonnes): 6 colonne(s) au lieu de 5.")
+        self.assertFalse(License.objects.exists())
+
+    def test_license_number_repeated_in_a_later_chunk_is_reported(self):
+        from license_app.import_pipeline import validate_file
+
+        rows = [self.row(0), self.row(1), self.row(2), self.row(0)]
+        path = self.write_csv(rows)
+        errors = validate_file(path, chunk_size=2)
+        self.assertEqual([str(error) for error in errors], [
+            "Ligne 5 (license_number): Numéro de licence déjà présent plus haut dans le fichier.",
+        ])
+        with self.assertRaises(ImportAborted) as ctx:
+            stream_import(path, chunk_size=2)
+        self.assertIn("Ligne 5 (license_number)", str(ctx.exception))
+        self.assertEqual(ctx.exception.rows_committed, 2)
+
+        # Still found when the import resumes after the chunk holding the first one
+        with self.assertRaises(ImportAborted) as ctx:
+            stream_import(path, chunk_size=2, resume=True)
+        self.assertIn("Ligne 5 (license_number)", str(ctx.exception))
+
+    def test_xlsx_import(self):
+        from openpyxl import Workbook
+
+        path = os.path.join(self.tmpdir.name, 'licenses.xlsx')
+        workbook = Workbook()
+        workbook.active.append(['license_number', 'customer', 'product', 'expiry_date', 'status'])
+        for i in range(3):
+            workbook.active.append(self.row(i))
+        workbook.save(path)
+
+        out = StringIO()
+        call_command('import_licenses', path, '--chunk-size', '2', stdout=out)
+        self.assertIn("3 new", out.getvalue())
+
+    def test_failed_chunk_is_rolled_back_and_import_resumes(self):
+        rows = [self.row(i) for i in range(5)]
+        rows[3] = self.row(3, customer=9999)
+        path = self.write_csv(rows)
+
+        with self.assertRaises(ImportAborted) as ctx:
+            stream_import(path, chunk_size=2)
+        self.assertEqual(ctx.exception.rows_committed, 2)
+        self.assertIn("Ligne 5 (customer)", str(ctx.exception))  # data row 4, after the header
+        self.assertEqual(License.objects.count(), 2)
+
+        # Fix the faulty row, then resume after the committed chunk
+        rows[3] = self.row(3)
+        self.write_csv(rows)
+        License.objects.filter(license_number="LIC-STR-0").delete()
+        totals = stream_import(path, chunk_size=2, resume=True)
+        self.assertEqual(totals['new'], 3)
+        self.assertFalse(License.objects.filter(license_number="LIC-STR-0").exists())
+        self.assertEqual(License.objects.count(), 4)
+
+    def test_resume_refuses_a_changed_file(self):
+        path = self.write_csv([self.row(0), self.row(1), self.row(2, customer=9999)])
+        with self.assertRaises(ImportAborted):
+            stream_import(path, chunk_size=2)
+
+        self.write_csv([self.row(5), self.row(6), self.row(7)])
+        with self.assertRaises(ImportAborted) as ctx:
+            stream_import(path, chunk_size=2, resume=True)
+        self.assertIn("changé", str(ctx.exception))
+
+
+class ImportValidationTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Validation Corp")
+        self.product = Product.objects.create(name="Validation Product")
+
+    def test_all_errors_are_reported_at_once(self):
+        headers = ['license_number', 'customer', 'product', 'start_date', 'expiry_date', 'status']
+        c, p = self.customer.pk, self.product.pk
+        rows = [
+            ["LIC-VAL-1", c, p, '2024-01-01', '2025-01-01', 'active'],
+            ["LIC-VAL-2", c, p, '2025-06-01', '2025-01-01', 'active'],
+            ["LIC-VAL-3", 9999, p, '', 'not a date', 'active'],
+            ["LIC-VAL-4", float(c), 8888, '', '', 'unknown'],
+            ["LIC-VAL-1", '', '', '', '', ''],
+        ]
+        with self.assertNumQueries(2):
+            errors = validate_chunk(headers, rows, offset=10)
+
+        found = {(error.number, error.field) for error in errors}
+        self.assertEqual(found, {
+            (11, 'license_number'),
+            (12, 'start_date'),
+            (13, 'customer'),
+            (13, 'expiry_date'),
+            (14, 'product'),
+            (14, 'status'),
+            (15, 'license_number'),
+            (15, 'customer'),
+        })
+
+    def test_non_integral_ids_are_rejected(self):
+        headers = ['license_number', 'customer', 'product']
+        rows = [
+            ["LIC-VAL-1", f"{self.customer.pk}.7", self.product.pk],
+            ["LIC-VAL-2", float(self.customer.pk), self.product.pk + 0.5],
+        ]
+        errors = validate_chunk(headers, rows)
+        self.assertEqual([str(error) for error in errors], [
+            "Ligne 1 (customer): Identifiant invalide.",
+            "Ligne 2 (product): Identifiant invalide.",
+        ])
+
+    def test_validate_only_command(self):
+        path = os.path.join(tempfile.mkdtemp(), 'licenses.csv')
+        self.addCleanup(os.remove, path)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['license_number', 'customer', 'status'])
+            writer.writerow(['LIC-VAL-1', self.customer.pk, 'active'])
+            writer.writerow(['LIC-VAL-2', self.customer.pk, 'bogus'])
+
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('import_licenses', path, '--validate-only', stdout=out)
+        self.assertIn("Ligne 3 (status)", out.getvalue())
+        self.assertFalse(License.objects.exists())
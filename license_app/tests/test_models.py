@@ -2,6 +2,7 @@ from django.test import TestCase
 from django.utils import timezone
 from datetime import timedelta
 from license_app.models import License, Customer, ClientType, Product
+from django.db import connection
 from django.db.utils import IntegrityError
 
 class LicenseTests(TestCase):
@@ -66,3 +67,41 @@ class LicenseTests(TestCase):
         self.assertIn(l1, expiring)
         self.assertNotIn(l2, expiring)
         self.assertNotIn(l3, expiring)
+
+
+class LicenseIndexTests(TestCase):
+    """The hot querysets must be served by the composite indexes declared on License."""
+
+    def setUp(self):
+        customer = Customer.objects.create(name="Index Corp")
+        product = Product.objects.create(name="Index Product")
+        License.objects.create(license_number="LIC-IDX-1", customer=customer, product=product)
+        self.customer = customer
+        self.product = product
+
+    def assertUsesIndex(self, queryset, index_name):
+        if connection.vendor != 'sqlite':
+            self.skipTest("EXPLAIN QUERY PLAN is SQLite specific")
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_expiring_query_uses_status_expiry_index(self):
+        today = timezone.now().date()
+        expiring = License.objects.filter(
+            status='active',
+            expiry_date__lte=today + timedelta(days=30),
+            expiry_date__gte=today
+        )
+        self.assertUsesIndex(expiring, 'license_status_expiry_idx')
+
+    def test_expired_query_uses_status_expiry_index(self):
+        expired = License.objects.filter(status='active', expiry_date__lt=timezone.now().date())
+        self.assertUsesIndex(expired, 'license_status_expiry_idx')
+
+    def test_customer_query_uses_customer_expiry_index(self):
+        licenses = License.objects.filter(customer=self.customer).order_by('expiry_date')
+        self.assertUsesIndex(licenses, 'license_customer_expiry_idx')
+
+    def test_product_filter_uses_product_status_index(self):
+        licenses = License.objects.filter(product=self.product, status='active')
+        self.assertUsesIndex(licenses, 'license_product_status_idx')
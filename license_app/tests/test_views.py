@@ -1,8 +1,9 @@
 from django.test import TestCase, Client
 from django.contrib.auth.models import User
-from license_app.models import Customer, License, Product
+from license_app.models import Customer, License, LicenseEvent, Product
 from django.utils import timezone
 from datetime import timedelta
+from license_app.cache import license_cache
 
 class FrontOfficeTests(TestCase):
     def setUp(self):
@@ -48,9 +49,89 @@ class FrontOfficeTests(TestCase):
         self.assertContains(response, "LIC-USER-1")
         self.assertNotContains(response, "LIC-OTHER-1")
 
+    def test_dashboard_paginates_events(self):
+        license = License.objects.get(license_number="LIC-USER-1")
+        LicenseEvent.objects.bulk_create(
+            LicenseEvent(license=license, status='active', message=f"Événement {i}") for i in range(25)
+        )
+        self.client.login(username='testuser', password='password')
+        response = self.client.get('/')
+        self.assertEqual(len(response.context['events']), 20)
+        self.assertContains(response, "Page 1 / 2")
+        response = self.client.get('/?page=2')
+        self.assertEqual(len(response.context['events']), 5)
+
     def test_dashboard_shows_no_licenses_for_other_user(self):
         self.client.login(username='otheruser', password='password')
         response = self.client.get('/')
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "LIC-OTHER-1")
         self.assertNotContains(response, "LIC-USER-1")
+
+
+class LicenseValidationAPITests(TestCase):
+    def setUp(self):
+        license_cache.clear()
+        self.product = Product.objects.create(name="API Product")
+        self.customer = Customer.objects.create(name="API Corp")
+        self.license = License.objects.create(
+            license_number="LIC-API-1",
+            customer=self.customer,
+            product=self.product,
+            expiry_date=timezone.now().date() + timedelta(days=30),
+            status='active'
+        )
+
+    def test_validate_known_license(self):
+        response = self.client.get('/api/licenses/LIC-API-1/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['status'], 'active')
+        self.assertEqual(data['product'], "API Product")
+        self.assertEqual(data['expiry_date'], self.license.expiry_date.isoformat())
+        self.assertTrue(data['valid'])
+
+    def test_validate_unknown_license(self):
+        response = self.client.get('/api/licenses/LIC-NOPE/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.json()['valid'])
+
+    def test_hot_lookup_is_served_from_cache(self):
+        self.client.get('/api/licenses/LIC-API-1/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/licenses/LIC-API-1/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_save_invalidates_cache(self):
+        self.client.get('/api/licenses/LIC-API-1/')
+        self.license.suspend()
+        response = self.client.get('/api/licenses/LIC-API-1/')
+        self.assertEqual(response.json()['status'], 'suspended')
+        self.assertFalse(response.json()['valid'])
+
+    async def test_async_validation(self):
+        response = await self.async_client.get('/api/async/licenses/LIC-API-1/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['product'], "API Product")
+
+        response = await self.async_client.get('/api/async/licenses/LIC-NOPE/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_batch_validation(self):
+        License.objects.create(license_number="LIC-API-2", customer=self.customer, status='suspended')
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                '/api/licenses/validate/',
+                data={'license_numbers': ["LIC-API-1", "LIC-API-2", "LIC-NOPE"]},
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(set(data['licenses']), {"LIC-API-1", "LIC-API-2"})
+        self.assertEqual(data['licenses']["LIC-API-2"]['status'], 'suspended')
+        self.assertIsNone(data['licenses']["LIC-API-2"]['product'])
+        self.assertEqual(data['unknown'], ["LIC-NOPE"])
+
+    def test_batch_validation_rejects_bad_payload(self):
+        response = self.client.post('/api/licenses/validate/', data={'numbers': []}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
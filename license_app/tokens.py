@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+
+TOKEN_SALT = 'license_app.license-token'
+
+
+def _key():
+    return settings.LICENSE_TOKEN_KEY
+
+
+def token_max_age():
+    """Seconds a token stays valid after it was issued (LICENSE_TOKEN_MAX_AGE), None for no limit."""
+    return getattr(settings, 'LICENSE_TOKEN_MAX_AGE', 7 * 24 * 3600)
+
+
+def make_license_token(license_number, product, expiry_date, status):
+    """Return an HMAC-signed, timestamped token describing a license."""
+    payload = {
+        'n': license_number,
+        'p': product,
+        'e': expiry_date.isoformat() if expiry_date else None,
+        's': status,
+    }
+    return signing.dumps(payload, key=_key(), salt=TOKEN_SALT, compress=True)
+
+
+def issue_license_token(license):
+    """Build the token for a License instance."""
+    return make_license_token(
+        license.license_number,
+        license.product.name if license.product else None,
+        license.expiry_date,
+        license.status,
+    )
+
+
+def verify_license_token(token, max_age=None, today=None):
+    """
+    Check a token locally, without any database access.
+
+    Raises ``django.core.signing.BadSignature`` (or ``SignatureExpired`` when
+    older than ``max_age`` seconds, LICENSE_TOKEN_MAX_AGE by default) if the
+    token was tampered with or is too old.
+    Returns the decoded license data with a computed ``valid`` flag.
+    """
+    if max_age is None:
+        max_age = token_max_age()
+    data = signing.loads(token, key=_key(), salt=TOKEN_SALT, max_age=max_age)
+    today = today or timezone.now().date()
+    expiry_date = data['e']
+    expired = expiry_date is not None and expiry_date < today.isoformat()
+    return {
+        'license_number': data['n'],
+        'product': data['p'],
+        'expiry_date': expiry_date,
+        'status': data['s'],
+        'valid': data['s'] == 'active' and not expired,
+    }
@@ -0,0 +1,93 @@
+from django.utils import timezone
+
+from .cache import license_cache
+from .models import License
+
+
+_NOT_CACHED = object()
+
+# Stays below SQLite's historical limit of 999 bound parameters per query
+LOOKUP_CHUNK_SIZE = 500
+
+LOOKUP_FIELDS = ('pk', 'license_number', 'status', 'expiry_date', 'product__name')
+
+
+def license_payload(row, today=None):
+    """Build the compact validation payload for a row of LOOKUP_FIELDS values."""
+    today = today or timezone.now().date()
+    expiry_date = row['expiry_date']
+    is_expired = expiry_date is not None and expiry_date < today
+    status = 'expired' if is_expired and row['status'] == 'active' else row['status']
+    return {
+        'license_number': row['license_number'],
+        'status': status,
+        'expiry_date': expiry_date.isoformat() if expiry_date else None,
+        'product': row['product__name'],
+        'valid': status == 'active',
+    }
+
+
+def lookup_license(license_number):
+    """
+    Return the cached row for a license number, or None if it does not exist.
+
+    Unknown numbers are cached as well so that repeated probes do not hit the
+    database; the entry is dropped as soon as a License with that number is saved.
+    """
+    row = license_cache.get(license_number, _NOT_CACHED)
+    if row is _NOT_CACHED:
+        row = (
+            License.objects.filter(license_number=license_number)
+            .values(*LOOKUP_FIELDS)
+            .first()
+        )
+        license_cache.set(license_number, row, pk=row['pk'] if row else None)
+    return row
+
+
+async def alookup_license(license_number):
+    """
+    Async variant of lookup_license for the ASGI path.
+
+    The cache is guarded by a lock that is only held for dictionary operations,
+    so using it from the event loop never blocks on I/O.
+    """
+    row = license_cache.get(license_number, _NOT_CACHED)
+    if row is _NOT_CACHED:
+        row = await (
+            License.objects.filter(license_number=license_number)
+            .values(*LOOKUP_FIELDS)
+            .afirst()
+        )
+        license_cache.set(license_number, row, pk=row['pk'] if row else None)
+    return row
+
+
+def lookup_licenses(license_numbers, chunk_size=LOOKUP_CHUNK_SIZE):
+    """
+    Resolve many license numbers at once.
+
+    Cached numbers are answered from memory; the remaining ones are fetched with
+    one ``IN`` query per chunk. Returns a dict mapping every requested number to
+    its row, or None when the license does not exist.
+    """
+    rows = {}
+    misses = []
+    for number in dict.fromkeys(license_numbers):
+        row = license_cache.get(number, _NOT_CACHED)
+        if row is _NOT_CACHED:
+            misses.append(number)
+        else:
+            rows[number] = row
+
+    for i in range(0, len(misses), chunk_size):
+        chunk = misses[i:i + chunk_size]
+        found = {
+            row['license_number']: row
+            for row in License.objects.filter(license_number__in=chunk).values(*LOOKUP_FIELDS)
+        }
+        for number in chunk:
+            row = found.get(number)
+            license_cache.set(number, row, pk=row['pk'] if row else None)
+            rows[number] = row
+    return rows
@@ -1,6 +1,18 @@
+import json
+
 from django.shortcuts import render
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from .models import License
+from django.core.paginator import Paginator
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from .models import License, LicenseEvent
+from .validation import alookup_license, license_payload, lookup_license, lookup_licenses
+
+DASHBOARD_EVENTS_PER_PAGE = 20
+
 
 @login_required
 def dashboard(request):
@@ -8,6 +20,78 @@ def dashboard(request):
     Dashboard for logged-in users to view their assigned licenses.
     """
     # A user can be associated with multiple customers
-    licenses = License.objects.filter(customer__users=request.user).select_related('product', 'customer').order_by('expiry_date')
+    licenses = (
+        License.objects.filter(customer__users=request.user)
+        .select_related('product', 'customer')
+        .with_expiry()
+        .order_by('expiry_date')
+    )
+    events = LicenseEvent.objects.filter(license__customer__users=request.user).select_related('license')
+    events = Paginator(events, DASHBOARD_EVENTS_PER_PAGE).get_page(request.GET.get('page'))
+
+    return render(request, 'license_app/dashboard.html', {'licenses': licenses, 'events': events})
+
+
+@require_GET
+def validate_license(request, license_number):
+    """
+    Machine-facing validation endpoint: returns status, expiry date and product.
+    Hot lookups are served from the in-process cache without touching the database.
+    """
+    row = lookup_license(license_number)
+    if row is None:
+        return JsonResponse(
+            {'license_number': license_number, 'valid': False, 'error': 'unknown'},
+            status=404,
+        )
+    return JsonResponse(license_payload(row))
+
+
+async def avalidate_license(request, license_number):
+    """
+    Async version of validate_license, served natively by the ASGI application
+    so that a single worker can handle many concurrent lookups.
+    """
+    # require_GET only supports coroutine views from Django 5.0 onwards
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    row = await alookup_license(license_number)
+    if row is None:
+        return JsonResponse(
+            {'license_number': license_number, 'valid': False, 'error': 'unknown'},
+            status=404,
+        )
+    return JsonResponse(license_payload(row))
+
+
+@csrf_exempt
+@require_POST
+def validate_licenses_batch(request):
+    """
+    Batch validation endpoint for fleet agents.
+
+    Expects a JSON body ``{"license_numbers": [...]}`` and returns a map of
+    license number to payload, with unknown numbers listed separately.
+    """
+    try:
+        numbers = json.loads(request.body)['license_numbers']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': "Expected a JSON body with a 'license_numbers' list."}, status=400)
+
+    if not isinstance(numbers, list) or not all(isinstance(n, str) for n in numbers):
+        return JsonResponse({'error': "'license_numbers' must be a list of strings."}, status=400)
+
+    max_size = getattr(settings, 'LICENSE_BATCH_MAX_SIZE', 5000)
+    if len(numbers) > max_size:
+        return JsonResponse({'error': f"At most {max_size} license numbers per request."}, status=400)
+
+    today = timezone.now().date()
+    licenses = {}
+    unknown = []
+    for number, row in lookup_licenses(numbers).items():
+        if row is None:
+            unknown.append(number)
+        else:
+            licenses[number] = license_payload(row, today)
 
-    return render(request, 'license_app/dashboard.html', {'licenses': licenses})
+    return JsonResponse({'licenses': licenses, 'unknown': unknown})
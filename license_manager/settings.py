@@ -10,11 +10,17 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+from dotenv import load_dotenv
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+load_dotenv(BASE_DIR / '.env')
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
@@ -134,3 +140,46 @@ LOGOUT_REDIRECT_URL = 'login'
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'admin@licensemanager.local'
+
+# Expiration alert delivery (check_expirations)
+LICENSE_ALERT_THRESHOLDS = [30, 7, 1]  # Days before expiry at which a license is alerted
+LICENSE_ALERT_BATCH_SIZE = 100  # Emails sent per backend connection
+LICENSE_ALERT_CONCURRENCY = 1  # Batches delivered in parallel
+LICENSE_ALERT_RATE_LIMIT = None  # Max emails per second, None for unlimited
+
+# License validation API
+LICENSE_CACHE_SIZE = 10000  # Max license lookups kept in memory per process
+# Seconds before a cached lookup is refreshed. The cache is per process: bulk
+# changes made in another process (other web workers, queued jobs run by
+# run_worker) reach the validation API only after this delay.
+LICENSE_CACHE_TIMEOUT = 300
+LICENSE_BATCH_MAX_SIZE = 5000  # Max license numbers per batch validation request
+
+# Offline license tokens (HMAC key shared with client software, distinct from SECRET_KEY)
+LICENSE_TOKEN_KEY = os.environ.get('LICENSE_TOKEN_KEY')
+if not LICENSE_TOKEN_KEY:
+    if not DEBUG:
+        raise ImproperlyConfigured("LICENSE_TOKEN_KEY must be set when DEBUG is False")
+    LICENSE_TOKEN_KEY = 'django-insecure-license-token-key'
+# Seconds a token is accepted after it was issued, so that a suspension reaches
+# clients once their token is renewed (issue_license_tokens renews at half this age)
+LICENSE_TOKEN_MAX_AGE = 7 * 24 * 3600
+
+# Background license exports (run_export_jobs)
+LICENSE_EXPORT_ROOT = BASE_DIR / 'exports'
+
+# Streaming license import (import_licenses)
+LICENSE_IMPORT_CHUNK_SIZE = 1000  # Rows committed per transaction
+
+# Admin bulk actions and bulk maintenance commands
+LICENSE_BULK_CHUNK_SIZE = 1000  # Licenses updated per transaction
+LICENSE_BULK_BATCH_SIZE = 500  # Rows per INSERT when writing history
+LICENSE_BULK_JOB_THRESHOLD = 1000  # Larger selections are queued for run_worker, None to always run inline
+LICENSE_JOB_TIMEOUT = 3600  # Seconds without progress after which a running job is marked failed (its worker died)
+
+# License history storage: 'delta' records only the changed fields of each change, 'full' the whole row
+LICENSE_HISTORY_MODE = 'delta'
+
+# History retention (prune_history)
+LICENSE_HISTORY_RETENTION_DAYS = 365  # History older than this is pruned, except the latest record per object
+LICENSE_HISTORY_ARCHIVE_ROOT = BASE_DIR / 'history_archive'
@@ -22,6 +22,9 @@ from license_app import views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.dashboard, name='dashboard'),
+    path('api/licenses/validate/', views.validate_licenses_batch, name='validate_licenses_batch'),
+    path('api/licenses/<str:license_number>/', views.validate_license, name='validate_license'),
+    path('api/async/licenses/<str:license_number>/', views.avalidate_license, name='avalidate_license'),
     path('accounts/login/', auth_views.LoginView.as_view(), name='login'),
     path('accounts/logout/', auth_views.LogoutView.as_view(next_page='/'), name='logout'),
 ]